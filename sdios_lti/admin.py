@@ -1,9 +1,72 @@
 from django.contrib import admin
+from django.utils import timezone
 
-from sdios_lti.models import Consumer, EnvironmentMap, UserMap, Setting
+from sdios_lti.models import Consumer, CourseContext, CourseEnvironment, CourseMember, EnvironmentMap, EnvironmentReplica, Job, SdiosUser, UserMap, UserEnvironment, Setting
+
+
+class EnvironmentReplicaInline(admin.TabularInline):
+    model = EnvironmentReplica
+    extra = 0
+
+
+class EnvironmentMapAdmin(admin.ModelAdmin):
+    inlines = [EnvironmentReplicaInline]
+    actions = ["refresh_copies"]
+
+    def refresh_copies(self, request, queryset):
+        """
+        Forget which version of the source SDI each user copy was made
+        from, so that every user receives a fresh copy on their next
+        launch.
+        """
+
+        count = UserEnvironment.objects.filter(environment__in=queryset).update(source_version="")
+        self.message_user(request, "{} user copies will be refreshed on next launch.".format(count))
+    refresh_copies.short_description = "Refresh user copies on next launch"
+
+
+class CourseMemberInline(admin.TabularInline):
+    model = CourseMember
+    extra = 0
+    raw_id_fields = ["usermap"]
+
+
+class CourseEnvironmentInline(admin.TabularInline):
+    model = CourseEnvironment
+    extra = 0
+
+
+class CourseContextAdmin(admin.ModelAdmin):
+    list_display = ["context_id", "title", "consumer", "last_launch"]
+    list_filter = ["consumer"]
+    inlines = [CourseEnvironmentInline, CourseMemberInline]
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["name", "created", "run_after", "attempts", "is_dead"]
+    list_filter = ["name", "is_dead"]
+    actions = ["retry"]
+
+    def retry(self, request, queryset):
+        """
+        Run the selected jobs again as soon as possible, including jobs
+        which have failed for good.
+        """
+
+        count = queryset.update(is_dead=False, attempts=0, run_after=timezone.now())
+        self.message_user(request, "{} jobs will be retried.".format(count))
+    retry.short_description = "Retry selected jobs"
+
+
+class SettingAdmin(admin.ModelAdmin):
+    list_display = ["name", "sdios_url", "is_active"]
 
 
 admin.site.register(Consumer)
-admin.site.register(EnvironmentMap)
+admin.site.register(EnvironmentMap, EnvironmentMapAdmin)
 admin.site.register(UserMap)
-admin.site.register(Setting)
+admin.site.register(UserEnvironment)
+admin.site.register(Setting, SettingAdmin)
+admin.site.register(SdiosUser)
+admin.site.register(Job, JobAdmin)
+admin.site.register(CourseContext, CourseContextAdmin)
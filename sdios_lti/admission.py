@@ -0,0 +1,78 @@
+import asyncio
+import contextlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from sdios_lti.models import LaunchTicket
+
+
+# Seconds between checks of whether a waiting launch may proceed.
+POLL_INTERVAL = 0.5
+
+
+class QueueTimeout(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def admit(consumer, environment):
+    """
+    Wait until a launch of the specified environment by the specified
+    consumer may proceed, and hold its place among the launches in
+    progress until the block exits.
+
+    :class:`QueueTimeout` is raised if the launch is not admitted within
+    `LTI_LAUNCH_QUEUE_TIMEOUT` seconds.
+
+    :param consumer: The launching consumer.
+    :type consumer: :class:`Consumer`
+    :param environment: The environment being launched.
+    :type environment: :class:`EnvironmentMap`
+    """
+
+    ticket = LaunchTicket.objects.create(consumer=consumer, environment=environment)
+    try:
+        deadline = time.monotonic() + settings.LTI_LAUNCH_QUEUE_TIMEOUT
+        while not ticket.try_admit():
+            if time.monotonic() >= deadline:
+                raise QueueTimeout("launch queue is full")
+            time.sleep(POLL_INTERVAL)
+
+        yield ticket
+    finally:
+        ticket.finish()
+
+
+class AsyncAdmission:
+    """
+    Asynchronous version of :func:`admit`, used as::
+
+        async with AsyncAdmission(consumer, environment):
+            ...
+
+    Waiting is done without blocking the event loop.
+    """
+
+    def __init__(self, consumer, environment):
+        self.__consumer = consumer
+        self.__environment = environment
+        self.__ticket = None
+
+    async def __aenter__(self):
+        self.__ticket = await sync_to_async(LaunchTicket.objects.create)(consumer=self.__consumer, environment=self.__environment)
+        try:
+            deadline = time.monotonic() + settings.LTI_LAUNCH_QUEUE_TIMEOUT
+            while not await sync_to_async(self.__ticket.try_admit)():
+                if time.monotonic() >= deadline:
+                    raise QueueTimeout("launch queue is full")
+                await asyncio.sleep(POLL_INTERVAL)
+        except BaseException:
+            await sync_to_async(self.__ticket.finish)()
+            raise
+
+        return self.__ticket
+
+    async def __aexit__(self, *exc_info):
+        await sync_to_async(self.__ticket.finish)()
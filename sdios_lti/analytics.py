@@ -0,0 +1,136 @@
+import atexit
+import contextlib
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Aggregate, FloatField
+
+from sdios_lti.models import LaunchRecord
+
+
+class Percentile(Aggregate):
+    """
+    The continuous percentile of an expression, computed by the
+    database.  This is only supported by PostgreSQL.
+
+    :param expression: The expression to take the percentile of.
+    :param percentile: The percentile, between 0 and 1.
+    :type percentile: float
+    """
+
+    function = "PERCENTILE_CONT"
+    name = "Percentile"
+    template = "%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = FloatField()
+
+    def __init__(self, expression, percentile, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+class LaunchBuffer:
+    """
+    Launch records are collected in memory and written to the database
+    in batches by a background thread, so that recording a launch never
+    waits on the database.  The buffer is flushed once it holds
+    `LTI_LAUNCH_RECORD_BATCH` records, or `LTI_LAUNCH_RECORD_FLUSH_INTERVAL`
+    seconds after the first record was added, whichever comes first.
+    """
+
+    def __init__(self):
+        self.__records = []
+        self.__condition = threading.Condition()
+        self.__thread = None
+
+    def add(self, record):
+        """
+        Add a record to be written.
+
+        :param record: An unsaved launch record.
+        :type record: :class:`LaunchRecord`
+        """
+
+        with self.__condition:
+            self.__records.append(record)
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="launch-records", daemon=True)
+                self.__thread.start()
+                atexit.register(self.flush)
+            if len(self.__records) >= settings.LTI_LAUNCH_RECORD_BATCH:
+                self.__condition.notify()
+
+    def flush(self):
+        """
+        Write all buffered records to the database.
+        """
+
+        with self.__condition:
+            records, self.__records = self.__records, []
+
+        if records:
+            close_old_connections()
+            LaunchRecord.objects.bulk_create(records, batch_size=settings.LTI_LAUNCH_RECORD_BATCH)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__records:
+                    self.__condition.wait()
+                self.__condition.wait_for(lambda: len(self.__records) >= settings.LTI_LAUNCH_RECORD_BATCH,
+                                          timeout=settings.LTI_LAUNCH_RECORD_FLUSH_INTERVAL)
+
+            try:
+                self.flush()
+            except Exception as err:
+                # The records are lost, but recording launches must not
+                # stop because the database was briefly unavailable.
+                print("Failed to write launch records: {}".format(err))
+
+
+_buffer = LaunchBuffer()
+
+
+class LaunchRecorder:
+    """
+    Collect the outcome and phase durations of an LTI launch, and add
+    them to the launch record buffer when the launch finishes.
+    """
+
+    def __init__(self):
+        self.__start = time.monotonic()
+        self.record = LaunchRecord()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Time the enclosed block as the named phase of the launch.  The
+        duration is stored in the record's `<name>_ms` field.
+
+        :param name: The phase name.
+        :type name: string
+        """
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            setattr(self.record, "{}_ms".format(name), int((time.monotonic() - start) * 1000))
+
+    def finish(self, response):
+        """
+        Record the outcome of the launch, given the response to it, and
+        queue the record to be written.  A launch succeeds if the user
+        was redirected to their SDI; otherwise the response body is
+        recorded as the reason for failure.
+
+        :param response: The response to the launch.
+        :type response: :class:`django.http.HttpResponse`
+        """
+
+        self.record.total_ms = int((time.monotonic() - self.__start) * 1000)
+        self.record.succeeded = response.status_code < 400
+        if not self.record.succeeded:
+            self.record.failure = response.content.decode(errors="replace")[:255]
+
+        _buffer.add(self.record)
@@ -1,15 +1,150 @@
 import json
+import logging
+import threading
+import time
 
+import httpx
 import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
+from sdios_lti.apicalls import timed
+from sdios_lti.jsonstream import ArrayParser
 from sdios_lti.models import Setting
 
 
+logger = logging.getLogger(__name__)
+
+HTTP_NOT_MODIFIED = 304
+HTTP_UNAUTHORIZED = 401
+
+# Seconds before a token expires at which it stops being reused.
+TOKEN_EXPIRY_MARGIN = 60
+
+# Bytes read at a time from streamed responses.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# A session, and so a pool of connections, is kept for each backend so
+# that connections can be reused across API requests.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _get_session(backend):
+    with _sessions_lock:
+        if backend.pk not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.LTI_SDIOS_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[backend.pk] = session
+
+        return _sessions[backend.pk]
+
+
+# Asynchronous clients are likewise kept per backend.  Clients belong to
+# the event loop they were created in, which under ASGI is the single
+# loop serving the process.
+_clients = {}
+
+
+def _get_client(backend, verify):
+    key = (backend.pk, verify)
+    if key not in _clients:
+        limits = httpx.Limits(max_connections=settings.LTI_SDIOS_POOL_SIZE, max_keepalive_connections=settings.LTI_SDIOS_POOL_SIZE)
+        _clients[key] = httpx.AsyncClient(verify=verify, limits=limits, timeout=None)
+
+    return _clients[key]
+
+
+# Tokens are cached per backend and reused until shortly before they
+# expire, so that API objects do not each need to obtain a new one.
+_tokens = {}
+
+
+def _token_key(setting):
+    return (setting.pk, setting.sdios_url, setting.sdios_username, setting.sdios_password, setting.client_id, setting.client_secret)
+
+
+def _cached_headers(setting):
+    headers, expires = _tokens.get(_token_key(setting), (None, 0))
+    if expires > time.monotonic():
+        return headers
+
+
+def _cache_headers(setting, token):
+    headers = _headers(token)
+    if token.get("expires_in"):
+        _tokens[_token_key(setting)] = (headers, time.monotonic() + float(token["expires_in"]) - TOKEN_EXPIRY_MARGIN)
+
+    return headers
+
+
+def _check(setting, response):
+    """
+    Raise an exception for an error response, forgetting the cached
+    token if SDI OS no longer accepts it.
+    """
+
+    if response.status_code == HTTP_UNAUTHORIZED:
+        _tokens.pop(_token_key(setting), None)
+
+    response.raise_for_status()
+
+
+def _base_url(setting):
+    # SDI OS is reached over HTTPS unless a backend's URL explicitly
+    # says otherwise, as a local test instance's might.
+    if "://" in setting.sdios_url:
+        return setting.sdios_url
+
+    return "https://{}".format(setting.sdios_url)
+
+
+def _keep(predicate, entries):
+    if predicate is None:
+        return entries
+
+    return [entry for entry in entries if predicate(entry)]
+
+
+def _token_params(setting):
+    return {
+        "grant_type": "password",
+        "username": setting.sdios_username,
+        "password": setting.sdios_password,
+    }
+
+
+def _headers(token):
+    if "error" in token:
+        raise Exception(token["error"])
+
+    return {
+        "Authorization": "{} {}".format(token["token_type"], token["access_token"]),
+        "Content-Type": "application/json",
+        "Accept": "application/json; version=2.1.0",
+    }
+
+
+def _log_client_error(response):
+    if 400 <= response.status_code < 500:
+        logger.warning("SDI OS returned %s for %s: %s", response.status_code, response.request.url, response.text)
+
+
+def _done(call, response):
+    # Record the outcome of a call being timed.
+    call.status = response.status_code
+    call.size = len(response.content)
+
+
 class APIRequest:
     """
     This class allows API calls to be made to SDI OS.
-    Credentials are pulled from the Setting table in the database, so
-    nothing needs to be passed to the constructor.
+    Credentials are pulled from the Setting table in the database.  By
+    default the default backend is used, so nothing needs to be passed
+    to the constructor.
 
     When making API calls, paths are represented without the leading
     "api" and without a trailing slash.  For example, to call the API
@@ -19,31 +154,27 @@ class APIRequest:
     :param verify_ssl: If true, verify_ssl SSL certificates, raising an
         exception for invalid certificates.
     :type verify_ssl: bool
+    :param backend: The SDI OS backend to use, or `None` for the default
+        backend.
+    :type backend: :class:`Setting` or `None`
     """
 
-    def __init__(self, verify_ssl=False):
-        setting = Setting.get()
+    def __init__(self, verify_ssl=False, backend=None):
+        setting = backend or Setting.get()
 
-        self.__url = "https://{}".format(setting.sdios_url)
+        self.backend = setting
+        self.__url = _base_url(setting)
         self.__verify = verify_ssl
+        self.__session = _get_session(setting)
 
-        params = {
-            "grant_type": "password",
-            "username": setting.sdios_username,
-            "password": setting.sdios_password,
-        }
-
-        response = requests.post(self.__api("o/token"), data=params, auth=(setting.client_id, setting.client_secret), verify=self.__verify)
-        response.raise_for_status()
-
-        if "error" in response.json():
-            raise Exception(response.json()["error"])
+        self.__headers = _cached_headers(setting)
+        if self.__headers is None:
+            with timed(setting, "POST", "o/token") as call:
+                response = self.__session.post(self.__api("o/token"), data=_token_params(setting), auth=(setting.client_id, setting.client_secret), verify=self.__verify)
+                _done(call, response)
+            response.raise_for_status()
 
-        self.__headers = {
-            "Authorization": "{} {}".format(response.json()["token_type"], response.json()["access_token"]),
-            "Content-Type": "application/json",
-            "Accept": "application/json; version=2.1.0",
-        }
+            self.__headers = _cache_headers(setting, response.json())
 
     def post(self, path, params={}):
         """
@@ -60,11 +191,11 @@ class APIRequest:
             call, or `None` if nothing is returned.
         :rtype: dict or `None`
         """
-        response = requests.post(self.__api(path), data=json.dumps(params), headers=self.__headers, verify=self.__verify)
-        if 400 <= response.status_code < 500:
-            print(response.text)
-
-        response.raise_for_status()
+        with timed(self.backend, "POST", path) as call:
+            response = self.__session.post(self.__api(path), data=json.dumps(params), headers=self.__headers, verify=self.__verify)
+            _done(call, response)
+        _log_client_error(response)
+        _check(self.backend, response)
 
         return self.__json(response)
 
@@ -82,11 +213,76 @@ class APIRequest:
         :rtype: dict or `None`
         """
 
-        response = requests.get(self.__api(path), headers=self.__headers, verify=self.__verify)
-        response.raise_for_status()
+        with timed(self.backend, "GET", path) as call:
+            response = self.__session.get(self.__api(path), headers=self.__headers, verify=self.__verify)
+            _done(call, response)
+        _check(self.backend, response)
 
         return self.__json(response)
 
+    def stream(self, path, predicate=None):
+        """
+        Make a GET request to an API function which returns a list, and
+        yield the list's entries as they are received, rather than
+        reading the whole list into memory first.  If `predicate` is
+        given, only entries for which it returns true are yielded.
+
+        An exception is raised if there is a problem communicating with
+        the API, or if the specified API function returns an error.
+
+        :param path: The API function to call.
+        :type path: string
+        :param predicate: A function taking an entry and returning
+            whether to keep it, or `None` to keep all entries.
+        :type predicate: callable or `None`
+        :returns: An iterator over the entries of the returned list.
+        :rtype: iterator
+        """
+
+        # The call is timed until the whole list has been received.
+        with timed(self.backend, "GET", path) as call, self.__session.get(self.__api(path), headers=self.__headers, verify=self.__verify, stream=True) as response:
+            call.status = response.status_code
+            _check(self.backend, response)
+
+            parser = ArrayParser()
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                call.size += len(chunk)
+                yield from _keep(predicate, parser.feed(chunk))
+            yield from _keep(predicate, parser.close())
+
+    def get_if_changed(self, path, etag=None):
+        """
+        Make a conditional GET request.  If `etag` is given and SDI OS
+        reports that the result still has that ETag, the result is not
+        transferred again.
+
+        An exception is raised if there is a problem communicating with
+        the API, or if the specified API function returns an error.
+
+        :param path: The API function to call.
+        :type path: string
+        :param etag: The ETag of a previous result, or `None`.
+        :type etag: string or `None`
+        :returns: A pair of the JSON return value from the API call (or
+            `None` if it has not changed) and its ETag (or `None` if SDI
+            OS does not provide one).
+        :rtype: tuple
+        """
+
+        headers = dict(self.__headers)
+        if etag:
+            headers["If-None-Match"] = etag
+
+        with timed(self.backend, "GET", path) as call:
+            response = self.__session.get(self.__api(path), headers=headers, verify=self.__verify)
+            _done(call, response)
+        if response.status_code == HTTP_NOT_MODIFIED:
+            return None, etag
+
+        _check(self.backend, response)
+
+        return self.__json(response), response.headers.get("ETag")
+
     def put(self, path, params={}):
         """
         Make a PUT request.
@@ -103,11 +299,11 @@ class APIRequest:
         :rtype: dict or `None`
         """
 
-        response = requests.put(self.__api(path), data=json.dumps(params), headers=self.__headers, verify=self.__verify)
-        if 400 <= response.status_code < 500:
-            print(response.text)
-
-        response.raise_for_status()
+        with timed(self.backend, "PUT", path) as call:
+            response = self.__session.put(self.__api(path), data=json.dumps(params), headers=self.__headers, verify=self.__verify)
+            _done(call, response)
+        _log_client_error(response)
+        _check(self.backend, response)
 
         return self.__json(response)
 
@@ -125,8 +321,10 @@ class APIRequest:
         :rtype: dict or `None`
         """
 
-        response = requests.delete(self.__api(path), headers=self.__headers, verify=self.__verify)
-        response.raise_for_status()
+        with timed(self.backend, "DELETE", path) as call:
+            response = self.__session.delete(self.__api(path), headers=self.__headers, verify=self.__verify)
+            _done(call, response)
+        _check(self.backend, response)
 
         return self.__json(response)
 
@@ -149,3 +347,135 @@ class APIRequest:
 
     def __api(self, path):
         return "{}/api/{}/".format(self.__url, path)
+
+
+class AsyncAPIRequest:
+    """
+    An asynchronous counterpart of :class:`APIRequest`, for use from
+    async views.  Requests are made without blocking, so that a single
+    process can wait on many SDI OS calls at once.
+
+    Instances are created with :meth:`connect` rather than directly,
+    since obtaining a token requires an API call.
+
+    :param backend: The SDI OS backend to use.
+    :type backend: :class:`Setting`
+    :param client: The client to make requests with.
+    :type client: :class:`httpx.AsyncClient`
+    :param headers: Headers to send with each request.
+    :type headers: dict
+    """
+
+    def __init__(self, backend, client, headers):
+        self.backend = backend
+        self.__url = _base_url(backend)
+        self.__client = client
+        self.__headers = headers
+
+    @staticmethod
+    async def connect(verify_ssl=False, backend=None):
+        """
+        Obtain a token and return an :class:`AsyncAPIRequest` which uses
+        it.
+
+        :param verify_ssl: If true, verify_ssl SSL certificates, raising
+            an exception for invalid certificates.
+        :type verify_ssl: bool
+        :param backend: The SDI OS backend to use, or `None` for the
+            default backend.
+        :type backend: :class:`Setting` or `None`
+        :rtype: :class:`AsyncAPIRequest`
+        """
+
+        setting = backend or await sync_to_async(Setting.get)()
+        client = _get_client(setting, verify_ssl)
+
+        headers = _cached_headers(setting)
+        if headers is None:
+            with timed(setting, "POST", "o/token") as call:
+                response = await client.post("{}/api/o/token/".format(_base_url(setting)), data=_token_params(setting), auth=(setting.client_id, setting.client_secret))
+                _done(call, response)
+            response.raise_for_status()
+
+            headers = _cache_headers(setting, response.json())
+
+        return AsyncAPIRequest(setting, client, headers)
+
+    async def post(self, path, params={}):
+        """
+        Make a POST request.  See :meth:`APIRequest.post`.
+        """
+
+        with timed(self.backend, "POST", path) as call:
+            response = await self.__client.post(self.__api(path), content=json.dumps(params), headers=self.__headers)
+            _done(call, response)
+        _log_client_error(response)
+        _check(self.backend, response)
+
+        return self.__json(response)
+
+    async def get(self, path):
+        """
+        Make a GET request.  See :meth:`APIRequest.get`.
+        """
+
+        with timed(self.backend, "GET", path) as call:
+            response = await self.__client.get(self.__api(path), headers=self.__headers)
+            _done(call, response)
+        _check(self.backend, response)
+
+        return self.__json(response)
+
+    async def stream(self, path, predicate=None):
+        """
+        Make a GET request to an API function which returns a list, and
+        yield the list's entries as they are received.  See
+        :meth:`APIRequest.stream`.
+        """
+
+        with timed(self.backend, "GET", path) as call:
+            async with self.__client.stream("GET", self.__api(path), headers=self.__headers) as response:
+                call.status = response.status_code
+                _check(self.backend, response)
+
+                parser = ArrayParser()
+                async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                    call.size += len(chunk)
+                    for entry in _keep(predicate, parser.feed(chunk)):
+                        yield entry
+                for entry in _keep(predicate, parser.close()):
+                    yield entry
+
+    async def put(self, path, params={}):
+        """
+        Make a PUT request.  See :meth:`APIRequest.put`.
+        """
+
+        with timed(self.backend, "PUT", path) as call:
+            response = await self.__client.put(self.__api(path), content=json.dumps(params), headers=self.__headers)
+            _done(call, response)
+        _log_client_error(response)
+        _check(self.backend, response)
+
+        return self.__json(response)
+
+    async def delete(self, path):
+        """
+        Make a DELETE request.  See :meth:`APIRequest.delete`.
+        """
+
+        with timed(self.backend, "DELETE", path) as call:
+            response = await self.__client.delete(self.__api(path), headers=self.__headers)
+            _done(call, response)
+        _check(self.backend, response)
+
+        return self.__json(response)
+
+    def __json(self, response):
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def __api(self, path):
+        return "{}/api/{}/".format(self.__url, path)
@@ -0,0 +1,108 @@
+import collections
+import contextlib
+import os
+import re
+import time
+
+from django.conf import settings
+
+from sdios_lti.workerstats import WorkerStats
+
+
+# IDs in API paths, replaced so that calls to the same endpoint are
+# grouped together.
+_ID = re.compile(r"(?<=/)([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)(?=/|$)")
+
+# Slow or failed calls made by this worker, newest last.  Appending to a
+# deque with a maximum length is atomic, so calls are recorded from any
+# thread without locking, and the oldest entries fall off the end.
+_calls = collections.deque(maxlen=settings.LTI_API_CALL_BUFFER)
+
+# Calls made by a process before it forked a worker are not the
+# worker's own.
+os.register_at_fork(after_in_child=_calls.clear)
+
+
+def _snapshot():
+    return [dict(zip(("time", "backend", "method", "path", "status", "ms", "size"), call)) for call in list(_calls)]
+
+
+_stats = WorkerStats("api-calls", _snapshot)
+
+
+class Call:
+    """
+    The outcome of an API call being timed by :func:`timed`.  The
+    caller sets `status` and `size` once the response is received.
+    """
+
+    status = None
+    size = 0
+
+
+@contextlib.contextmanager
+def timed(backend, method, path):
+    """
+    Time an SDI OS API call, recording it if it fails or takes longer
+    than `LTI_API_SLOW_MS` milliseconds.  A call which raises an
+    exception, or whose status is not set, counts as failed.
+
+    :param backend: The SDI OS backend called.
+    :type backend: :class:`sdios_lti.models.Setting`
+    :param method: The HTTP method.
+    :type method: string
+    :param path: The API function called.
+    :type path: string
+    :returns: A context manager yielding a :class:`Call`.
+    """
+
+    call = Call()
+    start = time.monotonic()
+    try:
+        yield call
+    finally:
+        ms = (time.monotonic() - start) * 1000
+        if ms >= settings.LTI_API_SLOW_MS or call.status is None or call.status >= 400:
+            _calls.append((time.time(), backend.name, method, path, call.status, round(ms), call.size))
+            _stats.changed()
+
+
+def recent_calls(minutes):
+    """
+    Return the slow and failed calls recorded by all workers in the last
+    `minutes` minutes, slowest first.
+
+    :param minutes: How far back to look.
+    :type minutes: int
+    :rtype: list
+    """
+
+    since = time.time() - minutes * 60
+    calls = [dict(call, pid=pid) for pid, calls in WorkerStats.collect("api-calls", max_age=24 * 60 * 60) for call in calls if call["time"] >= since]
+
+    return sorted(calls, key=lambda call: call["ms"], reverse=True)
+
+
+def summarize(calls):
+    """
+    Group calls by backend and endpoint, with IDs in paths ignored.
+
+    :param calls: Calls as returned by :func:`recent_calls`.
+    :type calls: list
+    :returns: Dicts with each endpoint's backend, method, path, number
+        of slow and failed calls, and longest duration, the endpoint with
+        the most calls first.
+    :rtype: list
+    """
+
+    endpoints = {}
+    for call in calls:
+        key = (call["backend"], call["method"], _ID.sub("{id}", call["path"]))
+        endpoint = endpoints.setdefault(key, {"backend": key[0], "method": key[1], "path": key[2], "slow": 0, "failed": 0, "max_ms": 0})
+        if call["status"] is None or call["status"] >= 400:
+            endpoint["failed"] += 1
+        else:
+            endpoint["slow"] += 1
+        endpoint["max_ms"] = max(endpoint["max_ms"], call["ms"])
+
+    return sorted(endpoints.values(), key=lambda e: e["slow"] + e["failed"], reverse=True)
@@ -0,0 +1,20 @@
+"""
+ASGI config for sdios_lti project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+LTI launches are served by an async view, so a single process can
+handle many launches waiting on SDI OS at once.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sdios_lti.settings")
+os.environ.setdefault("SDIOS_LTI_ASGI", "1")
+
+from django.core.asgi import get_asgi_application
+application = get_asgi_application()
+
+from sdios_lti.warmup import schedule
+schedule()
@@ -0,0 +1,18 @@
+# Static files used by the templates, grouped into the bundles which
+# replace them in production.  Paths are relative to the static
+# directory, and files are bundled in the order listed.
+#
+# Bundles are written next to the files they replace, so that relative
+# URLs in stylesheets (such as the icon fonts) still resolve.
+BUNDLES = {
+    "css": ("css/lti.bundle.css", (
+        "css/foundation.css",
+        "css/foundation-icons.css",
+        "css/lti.css",
+    )),
+    "js": ("js/lti.bundle.js", (
+        "js/vendor/modernizr.js",
+        "js/vendor/jquery.js",
+        "js/foundation.min.js",
+    )),
+}
@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RateLimiter:
+    """
+    Space out calls so that no more than `rate` calls per second are
+    made, across all threads sharing the limiter.
+
+    :param rate: Maximum calls per second, or `None` for no limit.
+    :type rate: float or `None`
+    """
+
+    def __init__(self, rate=None):
+        self.__interval = 1.0 / rate if rate else 0.0
+        self.__next = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until the next call is allowed.
+        """
+
+        if not self.__interval:
+            return
+
+        with self.__lock:
+            now = time.monotonic()
+            start = max(now, self.__next)
+            self.__next = start + self.__interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+def run_batched(fn, items, workers=4, rate=None, batch_size=100):
+    """
+    Call `fn` on each of `items` using a pool of threads, in batches of
+    `batch_size`, with calls limited to `rate` per second.  Results are
+    yielded as each batch completes, so callers can record progress
+    (and stop early) between batches.
+
+    Exceptions raised by `fn` are caught and yielded rather than
+    raised, so one failed call does not abort the batch.
+
+    :param fn: A function taking a single item.
+    :type fn: callable
+    :param items: The items to process.
+    :type items: iterable
+    :param workers: Number of concurrent calls.
+    :type workers: int
+    :param rate: Maximum calls per second, or `None` for no limit.
+    :type rate: float or `None`
+    :param batch_size: Number of items per batch.
+    :type batch_size: int
+    :returns: An iterator over lists of (item, result, exception)
+        tuples, one list per batch.
+    :rtype: iterator
+    """
+
+    limiter = RateLimiter(rate)
+
+    def call(item):
+        limiter.wait()
+        try:
+            return item, fn(item), None
+        except Exception as err:
+            return item, None, err
+
+    items = list(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(0, len(items), batch_size):
+            yield list(executor.map(call, items[i:i + batch_size]))
@@ -0,0 +1,59 @@
+import uuid
+
+from sdios_lti.models import Consumer, EnvironmentMap, SdiosUser, UserMap
+
+# Generated rows are named with this prefix, so they can be told apart
+# from real ones.
+PREFIX = "bench"
+
+# Rows are inserted this many at a time.
+BATCH_SIZE = 5000
+
+
+def generate(backend, stub, consumers=10, users=10000, environments=100, copies=1):
+    """
+    Populate the database with consumers, LTI users and exported SDIs,
+    and `stub` with a matching SDI OS inventory: the source SDIs, an SDI
+    OS account for each LTI user, and `copies` copies of source SDIs
+    for each of them.  The local mirror of SDI OS users is filled in as
+    `sync_sdios_users` would.
+
+    :param backend: The backend the LTI users are placed on.
+    :type backend: :class:`sdios_lti.models.Setting`
+    :param stub: The fake SDI OS to populate.
+    :type stub: :class:`sdios_lti.stub.StubSDIOS`
+    :param consumers: Number of consumers.
+    :type consumers: int
+    :param users: Number of LTI users, spread across the consumers.
+    :type users: int
+    :param environments: Number of exported SDIs.
+    :type environments: int
+    :param copies: Number of SDI copies each user has.
+    :type copies: int
+    """
+
+    consumer_rows = Consumer.objects.bulk_create(
+        (Consumer(name="{}-consumer-{}".format(PREFIX, i), key="{}-key-{}".format(PREFIX, i), secret=uuid.uuid4().hex) for i in range(consumers)),
+        batch_size=BATCH_SIZE,
+    )
+
+    sources = [stub.add_sdi("{}-sdi-{}".format(PREFIX, i)) for i in range(environments)]
+    EnvironmentMap.objects.bulk_create(
+        (EnvironmentMap(name=sdi["name"], lti_environment_key="{}-env-{}".format(PREFIX, i), sdios_environment_uuid=sdi["sdi_id"]) for i, sdi in enumerate(sources)),
+        batch_size=BATCH_SIZE,
+    )
+
+    for i in range(0, users, BATCH_SIZE):
+        usermaps = []
+        mirrored = []
+        for j in range(i, min(i + BATCH_SIZE, users)):
+            username = "SDIOS-LTI-{}-{:08x}".format(PREFIX, j)
+            user = stub.add_user(username)
+            for k in range(copies):
+                stub.add_sdi(sources[(j + k) % len(sources)]["name"], user=user["pk"])
+
+            usermaps.append(UserMap(consumer=consumer_rows[j % len(consumer_rows)], backend=backend, lti_user_id="{}-user-{}".format(PREFIX, j), sdios_username=username, sdios_password=uuid.uuid4().hex))
+            mirrored.append(SdiosUser(backend=backend, sdios_pk=user["pk"], username=username, tenancy=str(user["tenancy"])))
+
+        UserMap.objects.bulk_create(usermaps)
+        SdiosUser.objects.bulk_create(mirrored)
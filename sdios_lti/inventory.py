@@ -0,0 +1,180 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from sdios_lti.models import EnvironmentMap, SdiosUser, UserMap
+
+CACHE_KEY = "sdios_lti:inventory"
+
+# Only one thread in a process rebuilds the snapshot at a time; the rest
+# are served the previous snapshot meanwhile.
+_rebuild_lock = threading.Lock()
+
+
+def build(api):
+    """
+    Fetch the SDIs which may be exported, with their owners and LTI
+    mappings, in the form shown on the SDIs page.  Environments
+    belonging to SDI OS LTI users make up most of the SDI list, and it
+    makes no sense to export them, so they are left out.
+
+    :param api: An API object for the default backend.
+    :type api: :class:`sdios_lti.api.APIRequest`
+    :returns: The SDIs, keyed by SDI ID.
+    :rtype: dict
+    """
+
+    # Resolve owners from the local mirror of SDI OS users, only asking
+    # SDI OS about owners which are missing from it.
+    owners = {user.sdios_pk: user.username for user in SdiosUser.objects.filter(backend=api.backend)}
+    lti_usernames = set(UserMap.objects.values_list("sdios_username", flat=True))
+    lti_users = {pk for pk, username in owners.items() if username in lti_usernames}
+    mappings = {environment.sdios_environment_uuid: environment for environment in EnvironmentMap.objects.all()}
+
+    rows = {}
+    for environment in api.stream("sdis", lambda e: e["user"] not in lti_users):
+        if environment["user"] not in owners:
+            owners[environment["user"]] = SdiosUser.store(api.backend, api.get("accounts/users/{}".format(environment["user"]))).username
+
+        # Skip any remaining environments belonging to SDI OS LTI users
+        # which were missing from the mirror.
+        if owners[environment["user"]] in lti_usernames:
+            continue
+
+        mapping = mappings.get(environment["sdi_id"])
+        rows[environment["sdi_id"]] = {
+            "sdi_id": environment["sdi_id"],
+            "name": environment["name"],
+            "user": {"username": owners[environment["user"]]},
+            "lti_status": mapping is not None,
+            "lti_name": mapping.name if mapping else "",
+            "lti_key": mapping.lti_environment_key if mapping else "",
+        }
+
+    return rows
+
+
+def snapshot(api):
+    """
+    Return the cached inventory snapshot, rebuilding it first if it is
+    more than `LTI_INVENTORY_MAX_AGE` seconds old.
+
+    Each row carries the version of the snapshot in which it last
+    changed, and rows which have disappeared are remembered for
+    `LTI_INVENTORY_HISTORY` versions, so that clients can ask for just
+    the changes since the version they last saw (see :func:`changes`).
+    A snapshot's "lineage" identifies a series of snapshots with
+    comparable versions; it changes if the cache is lost.
+
+    :param api: An API object for the default backend.
+    :type api: :class:`sdios_lti.api.APIRequest`
+    :returns: A dict with the snapshot's "lineage", "version", "oldest"
+        version from which changes are known, "rows" (each a pair of
+        version and SDI) and "removed" (SDI IDs and the version in which
+        they were removed).
+    :rtype: dict
+    """
+
+    current = cache.get(CACHE_KEY)
+    if current is not None and current["built"] >= time.time() - settings.LTI_INVENTORY_MAX_AGE:
+        return current
+
+    if not _rebuild_lock.acquire(blocking=current is None):
+        return current
+
+    try:
+        # Another thread may have rebuilt it while this one waited.
+        latest = cache.get(CACHE_KEY)
+        if latest is not None and latest["built"] >= time.time() - settings.LTI_INVENTORY_MAX_AGE:
+            return latest
+
+        updated = _update(latest, build(api))
+        cache.set(CACHE_KEY, updated, None)
+        return updated
+    finally:
+        _rebuild_lock.release()
+
+
+def _update(previous, rows):
+    if previous is None:
+        return {"lineage": uuid.uuid4().hex, "version": 1, "oldest": 1, "built": time.time(), "rows": {sdi_id: (1, row) for sdi_id, row in rows.items()}, "removed": {}}
+
+    # The version only moves on when something has changed.
+    unchanged = rows.keys() == previous["rows"].keys() and all(previous["rows"][sdi_id][1] == row for sdi_id, row in rows.items())
+    if unchanged:
+        return dict(previous, built=time.time())
+
+    version = previous["version"] + 1
+    updated = {}
+    for sdi_id, row in rows.items():
+        old = previous["rows"].get(sdi_id)
+        updated[sdi_id] = old if old is not None and old[1] == row else (version, row)
+
+    removed = {sdi_id: removed_in for sdi_id, removed_in in previous["removed"].items() if sdi_id not in rows}
+    removed.update((sdi_id, version) for sdi_id in previous["rows"] if sdi_id not in rows)
+
+    # Forget removals made long ago; clients which have not polled since
+    # then are sent everything again.
+    oldest = max(previous["oldest"], version - settings.LTI_INVENTORY_HISTORY)
+    removed = {sdi_id: removed_in for sdi_id, removed_in in removed.items() if removed_in > oldest}
+
+    return {"lineage": previous["lineage"], "version": version, "oldest": oldest, "built": time.time(), "rows": updated, "removed": removed}
+
+
+def invalidate():
+    """
+    Have the next request rebuild the snapshot, e.g. after an SDI's LTI
+    mapping has changed.  Versions carry on from the current snapshot.
+    """
+
+    current = cache.get(CACHE_KEY)
+    if current is not None:
+        cache.set(CACHE_KEY, dict(current, built=0), None)
+
+
+def token(snapshot):
+    """
+    Return the version token clients pass to :func:`changes`.
+
+    :param snapshot: A snapshot as returned by :func:`snapshot`.
+    :type snapshot: dict
+    :rtype: string
+    """
+
+    return "{}:{}".format(snapshot["lineage"], snapshot["version"])
+
+
+def changes(snapshot, since):
+    """
+    Return the SDIs which have changed or been removed since the version
+    identified by the token `since`.  If the changes since then are not
+    known, every SDI is returned, with "reset" set.
+
+    :param snapshot: A snapshot as returned by :func:`snapshot`.
+    :type snapshot: dict
+    :param since: A version token from :func:`token`, or `None`.
+    :type since: string or `None`
+    :returns: A dict with the new "version" token, "reset", the
+        "changed" SDIs and the IDs of "removed" SDIs.
+    :rtype: dict
+    """
+
+    lineage, _, version = (since or "").partition(":")
+    try:
+        version = int(version)
+    except ValueError:
+        version = None
+
+    reset = lineage != snapshot["lineage"] or version is None or version < snapshot["oldest"] or version > snapshot["version"]
+    if reset:
+        version = 0
+
+    return {
+        "version": token(snapshot),
+        "reset": reset,
+        "changed": [row for changed_in, row in snapshot["rows"].values() if changed_in > version],
+        "removed": [] if reset else [sdi_id for sdi_id, removed_in in snapshot["removed"].items() if removed_in > version],
+    }
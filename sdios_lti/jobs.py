@@ -0,0 +1,106 @@
+import traceback
+
+import requests
+from django.db import close_old_connections
+
+from sdios_lti.api import APIRequest
+from sdios_lti.models import CourseEnvironment, EnvironmentMap, Job, Setting, UserMap
+
+
+# Handlers for each job name, registered with the job() decorator.
+_handlers = {}
+
+# Responses from SDI OS when asked to stop an SDI which is not running,
+# or has been deleted since the job was queued.
+NOT_RUNNING = (400, 404, 409)
+
+
+def job(name):
+    """
+    Register a function as the handler for jobs with the given name.
+    The function is passed the job's parameters as keyword arguments.
+
+    :param name: The job name.
+    :type name: string
+    """
+
+    def register(fn):
+        _handlers[name] = fn
+        return fn
+
+    return register
+
+
+def run(job):
+    """
+    Run a claimed job, deleting it if it succeeds and recording the
+    failure otherwise.  This is called from worker threads.
+
+    :param job: The job to run.
+    :type job: :class:`sdios_lti.models.Job`
+    :returns: Whether the job succeeded.
+    :rtype: bool
+    """
+
+    close_old_connections()
+    try:
+        try:
+            _handlers[job.name](**job.params)
+        except Exception:
+            job.failed(traceback.format_exc())
+            return False
+
+        job.delete()
+        return True
+    finally:
+        close_old_connections()
+
+
+@job("update_sdios_user")
+def update_sdios_user(usermap, user, tenancy):
+    try:
+        usermap = UserMap.objects.select_related("backend").get(pk=usermap)
+    except UserMap.DoesNotExist:
+        return
+
+    UserMap.update_sdios_user(APIRequest(backend=usermap.backend), usermap, user, tenancy)
+
+
+@job("stop_sdi")
+def stop_sdi(backend, sdi_id):
+    # The SDI may have been stopped since the job was queued, which is
+    # what the job was for.
+    try:
+        APIRequest(backend=Setting.objects.get(pk=backend)).post("sdis/{}/stop".format(sdi_id))
+    except requests.HTTPError as err:
+        if err.response is None or err.response.status_code not in NOT_RUNNING:
+            raise
+
+
+@job("prepare_course_environment")
+def prepare_course_environment(course_environment):
+    try:
+        course_environment = CourseEnvironment.objects.select_related("context", "environment").get(pk=course_environment)
+    except CourseEnvironment.DoesNotExist:
+        return
+
+    # Each learner is prepared by a job of their own, so that they are
+    # prepared in parallel and retried separately.
+    Job.enqueue("prepare_learner", *[{"usermap": member.usermap_id, "environment": course_environment.environment_id} for member in course_environment.unprepared_learners()])
+
+
+@job("prepare_learner")
+def prepare_learner(usermap, environment):
+    try:
+        usermap = UserMap.objects.select_related("backend", "consumer").get(pk=usermap)
+        environment = EnvironmentMap.objects.get(pk=environment)
+    except (UserMap.DoesNotExist, EnvironmentMap.DoesNotExist):
+        return
+
+    api = APIRequest(backend=usermap.backend)
+
+    # This recreates the user's SDI OS account if it has gone.
+    UserMap.get(api, usermap.consumer.key, usermap.lti_user_id)
+    # Learners who have a copy by now, made by a launch since the job was
+    # queued, are skipped.
+    UserMap.prepare(api, usermap, environment, ahead=True)
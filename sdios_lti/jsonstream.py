@@ -0,0 +1,107 @@
+import codecs
+import json
+
+
+class ArrayParser:
+    """
+    An incremental parser for a JSON array, which yields each element of
+    the array as soon as it has been received in full.  Only the element
+    being received is held in memory, however large the array.
+
+    Data is pushed to the parser with :meth:`feed`, so it can be used
+    with both blocking and asynchronous responses.  If the document is
+    not an array, it is parsed whole once all data has been received,
+    and yielded as a single element.
+    """
+
+    WHITESPACE = " \t\r\n"
+
+    def __init__(self):
+        self.__decoder = json.JSONDecoder()
+        self.__text = codecs.getincrementaldecoder("utf-8")()
+        self.__buffer = ""
+        self.__started = False
+        self.__whole = None
+        self.__finished = False
+
+    def feed(self, data):
+        """
+        Parse more of the document.
+
+        :param data: The next chunk of the document.
+        :type data: bytes
+        :returns: The elements completed by this chunk.
+        :rtype: list
+        """
+
+        self.__buffer += self.__text.decode(data)
+        return self.__parse(final=False)
+
+    def close(self):
+        """
+        Finish parsing the document.  :class:`ValueError` is raised if
+        the document is incomplete or invalid.
+
+        :returns: Any remaining elements.
+        :rtype: list
+        """
+
+        self.__buffer += self.__text.decode(b"", final=True)
+        items = self.__parse(final=True)
+        if not self.__finished:
+            raise ValueError("incomplete JSON array")
+
+        return items
+
+    def __parse(self, final):
+        if self.__whole is not None:
+            self.__whole.append(self.__buffer)
+            self.__buffer = ""
+            if not final:
+                return []
+            self.__finished = True
+            return [json.loads("".join(self.__whole))]
+
+        items = []
+        pos = 0
+        buffer = self.__buffer
+
+        while not self.__finished:
+            while pos < len(buffer) and buffer[pos] in self.WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+
+            if not self.__started:
+                if buffer[pos] != "[":
+                    # Not an array; fall back to parsing it whole.
+                    self.__whole = []
+                    self.__buffer = buffer[pos:]
+                    return self.__parse(final)
+                self.__started = True
+                pos += 1
+            elif buffer[pos] == ",":
+                pos += 1
+            elif buffer[pos] == "]":
+                self.__finished = True
+                pos += 1
+            else:
+                try:
+                    item, end = self.__decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    if final:
+                        raise
+                    break
+
+                # A number may continue in the next chunk, even after a
+                # prefix which is a number itself (e.g. "1." or "10e"), so
+                # an element is only complete once what follows it has
+                # been received.
+                if not final and (end == len(buffer) or buffer[end] not in self.WHITESPACE + ",]"):
+                    break
+
+                items.append(item)
+                pos = end
+
+        self.__buffer = buffer[pos:]
+        return items
@@ -0,0 +1,125 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+import sdios_lti.views
+from sdios_lti import fakedata
+from sdios_lti.api import APIRequest
+from sdios_lti.models import Setting
+from sdios_lti.stub import StubSDIOS
+
+
+# A cache of the benchmark's own, so that the SDIs page neither serves
+# nor replaces the live inventory snapshot.
+BENCHMARK_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "sdios-lti-benchmark"}}
+
+# The views benchmarked, by URL name.
+VIEWS = {
+    "sdis": sdios_lti.views.view_environments,
+    "users": sdios_lti.views.view_users,
+    "consumers": sdios_lti.views.view_consumers,
+}
+
+
+class Command(BaseCommand):
+    help = ("Measure the admin views against generated data and a stub SDI OS, reporting queries, SDI OS calls, time and peak memory.  "
+            "Everything is done in a transaction which is rolled back, but use a scratch database all the same.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumers", type=int, default=10, help="Number of consumers to generate.")
+        parser.add_argument("--users", type=int, default=10000, help="Number of LTI users to generate.")
+        parser.add_argument("--environments", type=int, default=100, help="Number of exported SDIs to generate.")
+        parser.add_argument("--copies", type=int, default=1, help="Number of SDI copies per user.")
+        parser.add_argument("--repeat", type=int, default=5, help="Times to call each view when timing it.")
+        parser.add_argument("--view", action="append", choices=sorted(VIEWS), help="Benchmark only this view.  May be given more than once.")
+        parser.add_argument("--output", help="Also write the results as JSON to this file, for comparing runs.")
+
+    def handle(self, *args, **options):
+        stub = StubSDIOS()
+        server = stub.start()
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES), transaction.atomic():
+                try:
+                    results = self.benchmark(stub, options)
+                finally:
+                    cache.clear()
+                transaction.set_rollback(True)
+        finally:
+            server.shutdown()
+
+        self.stdout.write("{:<12}{:>10}{:>12}{:>12}{:>12}{:>14}".format("view", "queries", "API calls", "median ms", "max ms", "peak memory"))
+        for result in results:
+            self.stdout.write("{view:<12}{queries:>10}{api_calls:>12}{median_ms:>12.0f}{max_ms:>12.0f}{peak_kib:>11} KiB".format(**result))
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({"sizes": {key: options[key] for key in ("consumers", "users", "environments", "copies")}, "results": results}, f, indent=2)
+
+    def benchmark(self, stub, options):
+        # Point the default backend, which the admin views use, at the
+        # stub for the duration of the transaction.
+        backend = Setting.get()
+        backend.sdios_url = stub.url
+        backend.users_etag = ""
+        backend.save()
+
+        started = time.perf_counter()
+        fakedata.generate(backend, stub, options["consumers"], options["users"], options["environments"], options["copies"])
+        self.stderr.write("Generated data in {:.1f} s".format(time.perf_counter() - started))
+
+        # Obtain a token now, so that it is not counted against the
+        # first view.
+        APIRequest(backend=backend)
+
+        user = User.objects.create_superuser("{}-admin".format(fakedata.PREFIX), "", None)
+        factory = RequestFactory()
+
+        results = []
+        for name in options["view"] or sorted(VIEWS):
+            view = VIEWS[name]
+
+            def call():
+                # Nothing is served from the cache, so that the SDIs page
+                # rebuilds its inventory snapshot on every call.
+                cache.clear()
+                request = factory.get("/{}/".format(name))
+                request.user = user
+                response = view(request)
+                if response.status_code != 200:
+                    raise CommandError("{} returned {}".format(name, response.status_code))
+
+            # With nothing cached, queries, API calls and memory are the
+            # same on each call, so they are measured once.  Tracing
+            # memory slows the view down, so it is timed separately.
+            api_calls = stub.calls
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as queries:
+                call()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            api_calls = stub.calls - api_calls
+
+            times = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                call()
+                times.append((time.perf_counter() - started) * 1000)
+
+            results.append({
+                "view": name,
+                "queries": len(queries.captured_queries),
+                "api_calls": api_calls,
+                "median_ms": statistics.median(times),
+                "max_ms": max(times),
+                "peak_kib": peak // 1024,
+            })
+
+        return results
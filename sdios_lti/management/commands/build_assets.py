@@ -0,0 +1,39 @@
+import os
+
+import rcssmin
+import rjsmin
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+from sdios_lti.assets import BUNDLES
+
+
+class Command(BaseCommand):
+    help = "Bundle and minify the static files used by the templates.  Run before collectstatic."
+
+    MINIFIERS = {
+        "css": rcssmin.cssmin,
+        "js": rjsmin.jsmin,
+    }
+
+    def handle(self, *args, **options):
+        static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "static")
+
+        for kind, (path, sources) in BUNDLES.items():
+            parts = []
+            for source in sources:
+                source_path = finders.find(source)
+                if source_path is None:
+                    raise CommandError("Cannot find static file {}".format(source))
+
+                with open(source_path, encoding="utf-8") as f:
+                    parts.append(self.MINIFIERS[kind](f.read()))
+
+            # Separate scripts with semicolons in case one lacks a
+            # trailing one.
+            content = (";\n" if kind == "js" else "\n").join(parts)
+
+            with open(os.path.join(static_dir, path), "w", encoding="utf-8") as f:
+                f.write(content)
+
+            self.stdout.write("Wrote {} ({} bytes from {} files)".format(path, len(content.encode()), len(sources)))
@@ -0,0 +1,124 @@
+import collections
+import datetime
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from sdios_lti.api import APIRequest
+from sdios_lti.batch import run_batched
+from sdios_lti.models import Consumer, SdiosUser, Setting, UserMap
+
+
+HTTP_NOT_FOUND = 404
+
+
+def _gone(err):
+    # Something deleted by an earlier, interrupted run is already gone.
+    return isinstance(err, requests.HTTPError) and err.response is not None and err.response.status_code == HTTP_NOT_FOUND
+
+
+class Command(BaseCommand):
+    help = "Delete LTI users, with their SDI OS accounts and SDIs, for a consumer and/or users who have not launched since a date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumer", help="Only deprovision users of the consumer with this key.")
+        parser.add_argument("--inactive-since", help="Only deprovision users who have not launched since this date (YYYY-MM-DD).  Users whose last launch is unknown are left alone.")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be done without doing it.")
+        parser.add_argument("--workers", type=int, default=4, help="Number of concurrent SDI OS calls.")
+        parser.add_argument("--rate", type=float, default=5.0, help="Maximum SDI OS calls per second.")
+        parser.add_argument("--batch", type=int, default=200, help="Number of users deleted per batch.")
+
+    def handle(self, *args, **options):
+        if not options["consumer"] and not options["inactive_since"]:
+            raise CommandError("Specify --consumer, --inactive-since or both.")
+
+        usermaps = UserMap.objects.all()
+        if options["consumer"]:
+            try:
+                usermaps = usermaps.filter(consumer=Consumer.get_consumer(options["consumer"]))
+            except Consumer.DoesNotExist:
+                raise CommandError("No consumer with key {}".format(options["consumer"]))
+        if options["inactive_since"]:
+            since = parse_date(options["inactive_since"])
+            if since is None:
+                raise CommandError("Invalid date: {}".format(options["inactive_since"]))
+            cutoff = timezone.make_aware(datetime.datetime.combine(since, datetime.time.min))
+            usermaps = usermaps.filter(last_launched__lt=cutoff)
+
+        for backend in Setting.objects.all():
+            backend_usermaps = usermaps.filter(backend=backend).order_by("pk")
+            total = backend_usermaps.count()
+            if total:
+                self.stdout.write("{}: {} users to deprovision".format(backend.name, total))
+                self.deprovision(APIRequest(backend=backend), backend_usermaps, total, options)
+
+    def deprovision(self, api, usermaps, total, options):
+        # Users deleted by an interrupted run are missing from SDI OS but
+        # still have a mapping; the sync makes sure they are not looked
+        # up again.
+        SdiosUser.sync(api)
+
+        targets = dict(usermaps.values_list("sdios_username", "pk"))
+        users = dict(SdiosUser.objects.filter(backend=api.backend, username__in=list(targets)).values_list("sdios_pk", "username"))
+
+        sdis = collections.defaultdict(list)
+        for sdi in api.stream("sdis", lambda e: e["user"] in users):
+            sdis[sdi["user"]].append(sdi["sdi_id"])
+
+        self.stdout.write("{} SDI OS users and {} SDIs to delete".format(len(users), sum(len(ids) for ids in sdis.values())))
+        if options["dry_run"]:
+            return
+
+        def delete_sdi(sdi_id):
+            # Stopping an SDI which is not running fails, which is fine.
+            try:
+                api.post("sdis/{}/stop".format(sdi_id))
+            except Exception:
+                pass
+            try:
+                api.delete("sdis/{}".format(sdi_id))
+            except Exception as err:
+                if not _gone(err):
+                    raise
+
+        def delete_user(username):
+            try:
+                api.delete("accounts/users/{}".format(username_pks[username]))
+            except Exception as err:
+                if not _gone(err):
+                    raise
+
+        username_pks = {username: pk for pk, username in users.items()}
+        usernames = list(targets)
+        done = failed = 0
+
+        # Mappings are only deleted once their SDI OS user and SDIs are,
+        # so an interrupted run picks up where it left off when run
+        # again.
+        for i in range(0, len(usernames), options["batch"]):
+            batch = usernames[i:i + options["batch"]]
+
+            failed_users = set()
+            sdi_owners = {sdi_id: username_pks[username] for username in batch if username in username_pks for sdi_id in sdis[username_pks[username]]}
+            for results in run_batched(delete_sdi, list(sdi_owners), workers=options["workers"], rate=options["rate"]):
+                for sdi_id, _, err in results:
+                    if err is not None:
+                        self.stderr.write("Failed to delete SDI {}: {}".format(sdi_id, err))
+                        failed_users.add(users[sdi_owners[sdi_id]])
+
+            to_delete = [username for username in batch if username in username_pks and username not in failed_users]
+            for results in run_batched(delete_user, to_delete, workers=options["workers"], rate=options["rate"]):
+                for username, _, err in results:
+                    if err is not None:
+                        self.stderr.write("Failed to delete SDI OS user {}: {}".format(username, err))
+                        failed_users.add(username)
+
+            deleted = [username for username in batch if username not in failed_users]
+            UserMap.objects.filter(pk__in=[targets[username] for username in deleted]).delete()
+            SdiosUser.objects.filter(backend=api.backend, username__in=deleted).delete()
+
+            done += len(deleted)
+            failed += len(failed_users)
+            self.stdout.write("{}/{} users deprovisioned, {} failed".format(done, total, failed))
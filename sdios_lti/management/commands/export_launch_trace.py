@@ -0,0 +1,73 @@
+import datetime
+import hashlib
+import hmac
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from sdios_lti.models import LaunchRecord
+
+
+def _parse_time(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError("Invalid date and time: {}".format(value))
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Write recorded LTI launches out as a trace which replay_launches can send again.  User IDs are replaced by a keyed hash."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Start of the period to export, e.g. \"2024-09-02 08:00\".  Defaults to a week ago.")
+        parser.add_argument("--until", help="End of the period to export.  Defaults to now.")
+        parser.add_argument("--output", help="File to write the trace to.  Defaults to standard output.")
+        parser.add_argument("--salt", help="Secret key for hashing user IDs, so that they cannot be recovered by hashing guessed IDs.  Defaults to SECRET_KEY.")
+
+    def handle(self, *args, **options):
+        salt = (options["salt"] or settings.SECRET_KEY).encode()
+        until = _parse_time(options["until"]) if options["until"] else timezone.now()
+        since = _parse_time(options["since"]) if options["since"] else until - datetime.timedelta(days=7)
+
+        records = LaunchRecord.objects.filter(created__gte=since, created__lt=until, consumer__isnull=False, environment__isnull=False)
+        records = records.select_related("consumer", "environment", "usermap").order_by("created")
+
+        output = open(options["output"], "w") if options["output"] else sys.stdout
+        count = 0
+        try:
+            start = None
+            for record in records.iterator():
+                start = start or record.created
+                output.write(json.dumps({
+                    "offset": (record.created - start).total_seconds(),
+                    "consumer": record.consumer.key,
+                    "environment": record.environment.lti_environment_key,
+                    "user": self.__user_hash(record, salt),
+                    "succeeded": record.succeeded,
+                    "total_ms": record.total_ms,
+                }) + "\n")
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write("Exported {} launches".format(count))
+
+    @staticmethod
+    def __user_hash(record, salt):
+        """
+        Return a stable, anonymous stand-in for the launching user, or
+        `None` if the launch failed before the user was known.
+        """
+
+        if record.usermap is None:
+            return None
+
+        return hmac.new(salt, "{}:{}".format(record.consumer.key, record.usermap.lti_user_id).encode(), hashlib.sha256).hexdigest()[:32]
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+
+from sdios_lti.models import LaunchTicket
+
+
+class Command(BaseCommand):
+    help = "Report on the LTI launch queue: launches waiting and in progress, and recent wait times."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=int, default=60, help="Report wait times for launches in the last this many minutes.")
+        parser.add_argument("--prune", type=int, metavar="DAYS", help="Delete finished launch tickets older than this many days.")
+
+    def handle(self, *args, **options):
+        live = LaunchTicket.live()
+        waiting = live.filter(admitted__isnull=True)
+        running = live.filter(admitted__isnull=False)
+
+        self.stdout.write("Waiting: {}  In progress: {}".format(waiting.count(), running.count()))
+        for field, label in (("consumer__name", "consumer"), ("environment__name", "SDI")):
+            rows = live.values(field).annotate(waiting=Count("pk", filter=Q(admitted__isnull=True)), total=Count("pk")).order_by("-total")
+            for row in rows:
+                self.stdout.write("  {} {}: {} waiting, {} in progress".format(label, row[field], row["waiting"], row["total"] - row["waiting"]))
+
+        since = timezone.now() - datetime.timedelta(minutes=options["minutes"])
+        recent = LaunchTicket.objects.filter(created__gte=since, finished__isnull=False)
+        stats = recent.filter(admitted__isnull=False).aggregate(count=Count("pk"), avg=Avg(F("admitted") - F("created")), max=Max(F("admitted") - F("created")))
+        turned_away = recent.filter(admitted__isnull=True).count()
+
+        self.stdout.write("Last {} minutes: {} admitted, {} turned away".format(options["minutes"], stats["count"], turned_away))
+        if stats["count"]:
+            self.stdout.write("  wait: average {}, maximum {}".format(stats["avg"], stats["max"]))
+
+        if options["prune"] is not None:
+            cutoff = timezone.now() - datetime.timedelta(days=options["prune"])
+            deleted, _ = LaunchTicket.objects.filter(finished__lt=cutoff).delete()
+            self.stdout.write("Pruned {} finished tickets".format(deleted))
@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sdios_lti.api import APIRequest
+from sdios_lti.batch import run_batched
+from sdios_lti.models import SdiosUser, Setting, UserEnvironment, UserMap
+
+
+class Command(BaseCommand):
+    help = "Stop or delete SDIs belonging to LTI users which have been idle too long."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be done without doing it.")
+        parser.add_argument("--daemon", action="store_true", help="Keep running, reaping every --interval seconds.")
+        parser.add_argument("--interval", type=int, default=300, help="Seconds between passes in daemon mode.")
+        parser.add_argument("--workers", type=int, default=4, help="Number of concurrent SDI OS calls.")
+        parser.add_argument("--rate", type=float, default=5.0, help="Maximum SDI OS calls per second.")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                self.reap(options)
+            except Exception as err:
+                if not options["daemon"]:
+                    raise
+                self.stderr.write("Reaping failed: {}".format(err))
+
+            if not options["daemon"]:
+                break
+
+            time.sleep(options["interval"])
+
+    def reap(self, options):
+        for backend in Setting.objects.all():
+            self.stdout.write("Reaping {}".format(backend.name))
+            self.reap_backend(APIRequest(backend=backend), options)
+
+    def reap_backend(self, api, options):
+        now = timezone.now()
+
+        SdiosUser.sync(api)
+        lti_usernames = UserMap.objects.filter(backend=api.backend).values("sdios_username")
+        lti_users = set(SdiosUser.objects.filter(backend=api.backend, username__in=lti_usernames).values_list("sdios_pk", flat=True))
+
+        copies = {copy.sdios_environment_uuid: copy for copy in UserEnvironment.objects.select_related("environment")}
+
+        to_stop = []
+        to_delete = []
+        for sdi in api.stream("sdis", lambda e: e["user"] in lti_users):
+            # Copies which are not recorded, or have never been launched
+            # or prepared, have been idle for an unknown time, so they
+            # are left alone rather than assumed to be idle.
+            copy = copies.get(sdi["sdi_id"])
+            last_used = copy and (copy.last_launched or copy.prepared)
+            if not last_used:
+                continue
+
+            idle = now - last_used
+            stop_after, delete_after = copy.environment.get_idle_thresholds()
+
+            if delete_after is not None and idle >= delete_after:
+                to_delete.append(sdi["sdi_id"])
+            elif stop_after is not None and idle >= stop_after and not copy.stopped:
+                to_stop.append(sdi["sdi_id"])
+
+        self.stdout.write("{} idle SDIs to stop, {} to delete".format(len(to_stop), len(to_delete)))
+        if options["dry_run"]:
+            return
+
+        def stop(sdi_id):
+            # Stopping an SDI which is not running fails, which is fine.
+            try:
+                api.post("sdis/{}/stop".format(sdi_id))
+            except Exception:
+                pass
+
+        def delete(sdi_id):
+            stop(sdi_id)
+            api.delete("sdis/{}".format(sdi_id))
+
+        for fn, sdi_ids, done in ((stop, to_stop, self.__mark_stopped), (delete, to_delete, self.__forget)):
+            for batch in run_batched(fn, sdi_ids, workers=options["workers"], rate=options["rate"]):
+                for sdi_id, _, err in batch:
+                    if err is not None:
+                        self.stderr.write("Failed to reap SDI {}: {}".format(sdi_id, err))
+                done([sdi_id for sdi_id, _, err in batch if err is None])
+
+    @staticmethod
+    def __mark_stopped(sdi_ids):
+        UserEnvironment.objects.filter(sdios_environment_uuid__in=sdi_ids).update(stopped=True)
+
+    @staticmethod
+    def __forget(sdi_ids):
+        UserEnvironment.objects.filter(sdios_environment_uuid__in=sdi_ids).delete()
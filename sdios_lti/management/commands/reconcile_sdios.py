@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sdios_lti.api import APIRequest
+from sdios_lti.models import EnvironmentMap, EnvironmentReplica, SdiosUser, Setting, UserEnvironment, UserMap
+
+
+class Command(BaseCommand):
+    help = ("Compare LTI users and SDIs with the SDI OS inventory and report (or, with --fix, remove) "
+            "entries which refer to users or SDIs that no longer exist.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Remove orphaned entries.")
+
+    def handle(self, *args, **options):
+        default = Setting.get()
+
+        for backend in Setting.objects.all():
+            api = APIRequest(backend=backend)
+
+            # Local entries are read before the inventories are fetched,
+            # so that entries made meanwhile, e.g. by a launch, are not
+            # mistaken for orphans.  Copies still being made by a launch
+            # have no SDI yet, and are left alone.
+            usermaps = dict(UserMap.objects.filter(backend=backend).values_list("sdios_username", "pk"))
+            replicas = list(EnvironmentReplica.objects.filter(backend=backend).values_list("sdios_environment_uuid", "pk"))
+            copies = list(UserEnvironment.objects.filter(usermap__backend=backend).exclude(sdios_environment_uuid="").values_list("sdios_environment_uuid", "pk"))
+            # Exported SDIs live on the default backend.
+            environments = list(EnvironmentMap.objects.values_list("sdios_environment_uuid", "pk")) if backend == default else []
+
+            # Fetch each inventory once, streaming it so that only the
+            # fields needed are kept; everything else is done with set
+            # operations in memory.
+            usernames = set()
+
+            def users():
+                for user in api.stream("accounts/users"):
+                    usernames.add(user["username"])
+                    yield user
+
+            SdiosUser.apply(backend, users(), None)
+            sdi_ids = {sdi["sdi_id"] for sdi in api.stream("sdis")}
+
+            missing_users = {username: pk for username, pk in usermaps.items() if username not in usernames}
+            stray_users = sorted(username for username in usernames - set(usermaps) if username.startswith("SDIOS-LTI-"))
+            missing_replicas = [(uuid, pk) for uuid, pk in replicas if uuid not in sdi_ids]
+            missing_copies = [(uuid, pk) for uuid, pk in copies if uuid not in sdi_ids]
+            missing_environments = [(uuid, pk) for uuid, pk in environments if uuid not in sdi_ids]
+
+            self.stdout.write("{}:".format(backend.name))
+            self.stdout.write("  {} LTI users missing from SDI OS".format(len(missing_users)))
+            self.stdout.write("  {} exported SDIs missing from SDI OS".format(len(missing_environments)))
+            self.stdout.write("  {} SDI replicas missing from SDI OS".format(len(missing_replicas)))
+            self.stdout.write("  {} user copies missing from SDI OS".format(len(missing_copies)))
+            self.stdout.write("  {} SDI OS LTI users without a mapping".format(len(stray_users)))
+            for username in stray_users:
+                self.stdout.write("    {}".format(username))
+
+            if options["fix"]:
+                # Check the candidates against SDI OS again, in case any
+                # appeared after the inventories were fetched.
+                found_users = {user["username"] for user in api.stream("accounts/users", lambda e: e["username"] in missing_users)}
+                candidates = {uuid for uuid, _ in missing_replicas + missing_copies + missing_environments}
+                found_sdis = {sdi["sdi_id"] for sdi in api.stream("sdis", lambda e: e["sdi_id"] in candidates)}
+
+                with transaction.atomic():
+                    # A launch may have replaced a copy meanwhile, so its
+                    # entry is only removed if it still refers to the
+                    # missing SDI.
+                    for uuid, pk in missing_copies:
+                        if uuid not in found_sdis:
+                            UserEnvironment.objects.filter(pk=pk, sdios_environment_uuid=uuid).delete()
+                    EnvironmentReplica.objects.filter(pk__in=[pk for uuid, pk in missing_replicas if uuid not in found_sdis]).delete()
+                    EnvironmentMap.objects.filter(pk__in=[pk for uuid, pk in missing_environments if uuid not in found_sdis]).delete()
+                    UserMap.objects.filter(pk__in=[pk for username, pk in missing_users.items() if username not in found_users]).delete()
+                self.stdout.write("  Removed orphaned entries")
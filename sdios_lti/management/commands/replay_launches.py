@@ -0,0 +1,135 @@
+import collections
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sdios_lti.models import Consumer, LaunchRecord
+from sdios_lti.utils import sign_launch
+
+
+HTTP_SERVICE_UNAVAILABLE = 503
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+class Command(BaseCommand):
+    help = "Replay a launch trace written by export_launch_trace against a running instance, and report latency, queueing and errors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("trace", help="Trace file written by export_launch_trace.")
+        parser.add_argument("--url", default="http://127.0.0.1:8000/lti/", help="URL of the LTI launch view to send launches to.")
+        parser.add_argument("--speed", type=float, default=1.0, help="Replay speed, e.g. 10 to send an hour of launches in six minutes.")
+        parser.add_argument("--workers", type=int, default=50, help="Launches which may be in flight at once.")
+        parser.add_argument("--secret", help="Sign every launch with this secret rather than the consumer's own.")
+
+    def handle(self, *args, **options):
+        if options["speed"] <= 0:
+            raise CommandError("--speed must be positive")
+
+        with open(options["trace"]) as trace:
+            launches = [json.loads(line) for line in trace if line.strip()]
+
+        self.__secrets = {}
+        self.__results = []
+        self.__lock = threading.Lock()
+        self.__session = requests.Session()
+        self.__session.mount(options["url"], requests.adapters.HTTPAdapter(pool_maxsize=options["workers"]))
+
+        self.stdout.write("Replaying {} launches at {}x".format(len(launches), options["speed"]))
+        started = timezone.now()
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for launch in launches:
+                due = start + launch["offset"] / options["speed"]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                try:
+                    body = self.__sign(launch, options["url"], options["secret"])
+                except Consumer.DoesNotExist:
+                    self.stderr.write("Skipping launch for unknown consumer {}".format(launch["consumer"]))
+                    continue
+
+                pool.submit(self.__send, options["url"], body, due)
+
+        self.__report(time.monotonic() - start, started)
+
+    def __sign(self, launch, url, secret):
+        """
+        Return a signed POST body for a launch from the trace.  Launches
+        whose user was not recorded are sent as a new user each time.
+        """
+
+        if secret is None:
+            if launch["consumer"] not in self.__secrets:
+                self.__secrets[launch["consumer"]] = Consumer.get_secret(launch["consumer"])
+            secret = self.__secrets[launch["consumer"]]
+
+        params = {
+            "oauth_consumer_key": launch["consumer"],
+            "oauth_signature_method": "HMAC-SHA1",
+            "oauth_timestamp": str(int(time.time())),
+            "oauth_nonce": uuid.uuid4().hex,
+            "oauth_version": "1.0",
+            "lti_message_type": "basic-lti-launch-request",
+            "lti_version": "LTI-1p0",
+            "resource_link_id": "replay",
+            "user_id": launch["user"] or uuid.uuid4().hex,
+            "custom_sdi": launch["environment"],
+        }
+
+        return sign_launch(params, url, secret)
+
+    def __send(self, url, body, due):
+        sent = time.monotonic()
+        try:
+            response = self.__session.post(url, data=body, headers={"Content-Type": "application/x-www-form-urlencoded"}, allow_redirects=False)
+            status = response.status_code
+        except requests.RequestException as err:
+            status = type(err).__name__
+        finished = time.monotonic()
+
+        with self.__lock:
+            self.__results.append((status, (finished - sent) * 1000, (sent - due) * 1000))
+
+    def __report(self, elapsed, started):
+        results = self.__results
+        statuses = collections.Counter(str(status) for status, _, _ in results)
+        errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+        latencies = [latency for _, latency, _ in results]
+        lags = [lag for _, _, lag in results]
+
+        self.stdout.write("Sent {} launches in {:.1f} s".format(len(results), elapsed))
+        for status, count in sorted(statuses.items()):
+            self.stdout.write("  {}: {}".format(status, count))
+        if results:
+            self.stdout.write("Error rate: {:.1%}".format(errors / len(results)))
+            self.stdout.write("Turned away with a full queue: {}".format(statuses[str(HTTP_SERVICE_UNAVAILABLE)]))
+            self.stdout.write("Latency ms: p50 {:.0f}, p95 {:.0f}, p99 {:.0f}, max {:.0f}".format(
+                _percentile(latencies, 0.5), _percentile(latencies, 0.95), _percentile(latencies, 0.99), max(latencies)))
+            # Launches sent late mean the replay itself could not keep up,
+            # and --workers should be raised.
+            self.stdout.write("Send lag ms: p95 {:.0f}, max {:.0f}".format(_percentile(lags, 0.95), max(lags)))
+
+        # If the instance replayed against shares this database, report
+        # the time launches spent waiting for admission, once its
+        # buffered launch records have been written.
+        time.sleep(settings.LTI_LAUNCH_RECORD_FLUSH_INTERVAL + 1)
+        waits = list(LaunchRecord.objects.filter(created__gte=started, queue_ms__isnull=False).values_list("queue_ms", flat=True))
+        if waits:
+            self.stdout.write("Queue wait ms: p50 {}, p95 {}, max {}".format(_percentile(waits, 0.5), _percentile(waits, 0.95), max(waits)))
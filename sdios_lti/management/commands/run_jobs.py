@@ -0,0 +1,44 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from sdios_lti import jobs
+from sdios_lti.models import Job
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs, such as stopping SDIs after a launch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Jobs to run at once.")
+        parser.add_argument("--interval", type=float, default=1, help="Seconds to wait before checking for jobs again when none are due.")
+        parser.add_argument("--once", action="store_true", help="Run the jobs which are due, then exit.")
+
+    def handle(self, *args, **options):
+        running = set()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            while True:
+                claimed = Job.claim(options["workers"] - len(running))
+                for job in claimed:
+                    running.add(pool.submit(self.__run, job))
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+                    continue
+
+                # Wait for a slot to free up, or for the interval to pass
+                # so that newly queued jobs are picked up.
+                done, running = wait(running, timeout=options["interval"], return_when=FIRST_COMPLETED)
+                running = set(running)
+
+    def __run(self, job):
+        if jobs.run(job):
+            return
+
+        if job.is_dead:
+            self.stderr.write("Job {} ({}) failed for good: {}".format(job.pk, job.name, job.last_error.strip().splitlines()[-1]))
+        else:
+            self.stderr.write("Job {} ({}) failed, will retry".format(job.pk, job.name))
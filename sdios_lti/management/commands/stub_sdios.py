@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from sdios_lti.models import EnvironmentMap, EnvironmentReplica
+from sdios_lti.stub import StubSDIOS
+
+
+class Command(BaseCommand):
+    help = "Serve an in-memory stand-in for SDI OS, seeded with the exported SDIs, for replaying launches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+        parser.add_argument("--port", type=int, default=8100, help="Port to listen on.")
+        parser.add_argument("--latency", type=float, default=0.05, help="Seconds each API call takes.")
+
+    def handle(self, *args, **options):
+        stub = StubSDIOS(latency=options["latency"])
+        for environment in EnvironmentMap.objects.all():
+            stub.add_sdi(environment.name, sdi_id=str(environment.sdios_environment_uuid))
+        for replica in EnvironmentReplica.objects.select_related("environment"):
+            stub.add_sdi(replica.environment.name, sdi_id=str(replica.sdios_environment_uuid))
+
+        server = stub.server(options["host"], options["port"])
+        self.stdout.write("Serving a stub SDI OS at {} with {} SDIs.  Point a backend's URL here to use it.".format(stub.url, len(stub.sdis)))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write("{} API calls served".format(stub.calls))
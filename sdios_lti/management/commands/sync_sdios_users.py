@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sdios_lti.api import APIRequest
+from sdios_lti.models import SdiosUser, Setting
+
+
+class Command(BaseCommand):
+    help = "Bring the local mirror of SDI OS users up to date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Fetch all users even if SDI OS reports no changes.")
+        parser.add_argument("--daemon", action="store_true", help="Keep running, syncing every --interval seconds.")
+        parser.add_argument("--interval", type=int, default=60, help="Seconds between syncs in daemon mode.")
+
+    def handle(self, *args, **options):
+        while True:
+            for backend in Setting.objects.all():
+                try:
+                    changes = SdiosUser.sync(APIRequest(backend=backend), full=options["full"])
+                except Exception as err:
+                    if not options["daemon"]:
+                        raise
+                    self.stderr.write("Syncing {} failed: {}".format(backend.name, err))
+                    continue
+
+                if changes is None:
+                    self.stdout.write("{}: unchanged".format(backend.name))
+                else:
+                    self.stdout.write("{}: {} created, {} updated, {} deleted".format(backend.name, *changes))
+
+            if not options["daemon"]:
+                break
+
+            time.sleep(options["interval"])
@@ -0,0 +1,212 @@
+import asyncio
+import collections
+import copy
+import logging
+import random
+import threading
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from sdios_lti.workerstats import WorkerStats
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in KiB, of the buckets in per-view peak memory
+# histograms.  Larger peaks fall in a final, unbounded bucket.
+BUCKETS = [2 ** n for n in range(8, 19)]
+
+# Allocations made by tracing itself are left out of allocation sites.
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _bucket(kib):
+    for bound in BUCKETS:
+        if kib <= bound:
+            return str(bound)
+
+    return "more"
+
+
+class MemoryProfilingMiddleware:
+    """
+    Trace the memory allocated while serving a sampled fraction
+    (`LTI_MEMORY_SAMPLE_RATE`) of requests, recording each view's peak
+    memory in a histogram and the code which allocated the most memory
+    at its largest peak.  Requests which exceed their view's budget
+    (`LTI_MEMORY_BUDGETS`, or `LTI_MEMORY_BUDGET_KB`) are logged.
+
+    Memory tracing is global to the process, so only one request is
+    traced at a time, and allocations made by other threads meanwhile
+    are counted too.  If sampling is off, the middleware removes itself
+    and costs nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.LTI_MEMORY_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the middleware as a coroutine function, as Django's
+            # own middleware do, so that it is awaited under ASGI.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+        self.__lock = threading.Lock()
+        self.__data_lock = threading.Lock()
+        self.__views = {}
+        self.__over_budget = collections.deque(maxlen=50)
+        self.__stats = WorkerStats("memory", self.__snapshot)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        watcher = self.__start()
+        if watcher is None:
+            return self.get_response(request)
+
+        try:
+            return self.get_response(request)
+        finally:
+            self.__finish(request, watcher)
+
+    async def __acall__(self, request):
+        watcher = self.__start()
+        if watcher is None:
+            return await self.get_response(request)
+
+        try:
+            return await self.get_response(request)
+        finally:
+            # Stopping the watcher and summarizing the snapshot take too
+            # long to do on the event loop.
+            await sync_to_async(self.__finish)(request, watcher)
+
+    def __start(self):
+        if random.random() >= settings.LTI_MEMORY_SAMPLE_RATE or tracemalloc.is_tracing() or not self.__lock.acquire(blocking=False):
+            return None
+
+        try:
+            tracemalloc.start(settings.LTI_MEMORY_TRACE_FRAMES)
+            watcher = _PeakWatcher()
+            watcher.start()
+        except BaseException:
+            self.__lock.release()
+            raise
+
+        return watcher
+
+    def __finish(self, request, watcher):
+        try:
+            watcher.stop()
+            peak = tracemalloc.get_traced_memory()[1]
+            sites = watcher.sites()
+            tracemalloc.stop()
+            self.__record(request, peak // 1024, sites)
+        finally:
+            self.__lock.release()
+
+    def __record(self, request, peak_kib, sites):
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match and match.url_name else "other"
+
+        with self.__data_lock:
+            stats = self.__views.setdefault(view, {"samples": 0, "max_kib": 0, "sites": [], "histogram": {}})
+            stats["samples"] += 1
+            stats["histogram"][_bucket(peak_kib)] = stats["histogram"].get(_bucket(peak_kib), 0) + 1
+            if peak_kib >= stats["max_kib"]:
+                stats["max_kib"] = peak_kib
+                stats["sites"] = sites
+
+        budget = settings.LTI_MEMORY_BUDGETS.get(view, settings.LTI_MEMORY_BUDGET_KB)
+        if budget is not None and peak_kib > budget:
+            logger.warning("%s %s allocated %d KiB, over its budget of %d KiB; top allocations: %s", request.method, request.path, peak_kib, budget, "; ".join("{site} ({kib} KiB)".format(**site) for site in sites))
+            with self.__data_lock:
+                self.__over_budget.append({"time": time.time(), "view": view, "path": request.path, "kib": peak_kib, "budget": budget, "sites": sites})
+
+        self.__stats.changed()
+
+    def __snapshot(self):
+        with self.__data_lock:
+            return copy.deepcopy({"views": self.__views, "over_budget": list(self.__over_budget)})
+
+
+class _PeakWatcher(threading.Thread):
+    """
+    Take a snapshot of traced allocations whenever traced memory reaches
+    a new high, so that the allocation sites reported are those live
+    near the peak rather than at the end of the request.
+    """
+
+    def __init__(self):
+        super().__init__(name="memory-watcher", daemon=True)
+        self.__stopped = threading.Event()
+        self.__high = 0
+        self.__snapshot = None
+
+    def run(self):
+        while not self.__stopped.wait(settings.LTI_MEMORY_SNAPSHOT_INTERVAL_MS / 1000):
+            self.__check()
+
+    def stop(self):
+        self.__stopped.set()
+        self.join()
+        self.__check()
+
+    def __check(self):
+        current = tracemalloc.get_traced_memory()[0]
+        # Only snapshot on a clear rise, since snapshots are expensive.
+        if self.__snapshot is None or current > self.__high * 1.1:
+            self.__high = current
+            self.__snapshot = tracemalloc.take_snapshot()
+
+    def sites(self):
+        """
+        Return the lines which had allocated the most memory at the
+        highest snapshot.
+
+        :returns: Dicts with each "site" and its allocated "kib".
+        :rtype: list
+        """
+
+        statistics = self.__snapshot.filter_traces(_FILTERS).statistics("lineno")
+        return [{"site": str(stat.traceback[0]), "kib": stat.size // 1024} for stat in statistics[:settings.LTI_MEMORY_TOP_SITES]]
+
+
+def collect():
+    """
+    Merge the memory statistics recorded by all workers.
+
+    :returns: A pair of per-view statistics, largest peak first, and
+        recent over-budget requests, newest first.
+    :rtype: tuple
+    """
+
+    views = {}
+    over_budget = []
+    for pid, stats in WorkerStats.collect("memory", max_age=24 * 60 * 60):
+        for view, worker in stats["views"].items():
+            merged = views.setdefault(view, {"view": view, "samples": 0, "max_kib": 0, "sites": [], "histogram": collections.Counter()})
+            merged["samples"] += worker["samples"]
+            merged["histogram"].update(worker["histogram"])
+            if worker["max_kib"] >= merged["max_kib"]:
+                merged["max_kib"] = worker["max_kib"]
+                merged["sites"] = worker["sites"]
+        over_budget.extend(dict(request, pid=pid) for request in stats["over_budget"])
+
+    for merged in views.values():
+        merged["buckets"] = [(label, merged["histogram"][label]) for label in [str(bound) for bound in BUCKETS] + ["more"]]
+        merged["budget"] = settings.LTI_MEMORY_BUDGETS.get(merged["view"], settings.LTI_MEMORY_BUDGET_KB)
+
+    return sorted(views.values(), key=lambda v: v["max_kib"], reverse=True), sorted(over_budget, key=lambda r: r["time"], reverse=True)
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.5 on 2026-10-19 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='environmentmap',
+            name='source_version',
+            field=models.CharField(blank=True, default='', help_text='Change this to make users receive a fresh copy of the SDI.  Leave blank to detect changes from SDI OS.', max_length=255, verbose_name='Source version'),
+        ),
+        migrations.CreateModel(
+            name='UserEnvironment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sdios_environment_uuid', models.CharField(max_length=36)),
+                ('source_version', models.CharField(blank=True, default='', max_length=255)),
+                ('environment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.EnvironmentMap')),
+                ('usermap', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.UserMap')),
+            ],
+            options={
+                'unique_together': {('usermap', 'environment')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.5 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0002_source_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='environmentmap',
+            name='idle_delete_minutes',
+            field=models.PositiveIntegerField(blank=True, help_text='Delete user copies this long after their last launch.  Leave blank for the site default.', null=True, verbose_name='Delete after idle minutes'),
+        ),
+        migrations.AddField(
+            model_name='environmentmap',
+            name='idle_stop_minutes',
+            field=models.PositiveIntegerField(blank=True, help_text='Stop user copies this long after their last launch.  Leave blank for the site default.', null=True, verbose_name='Stop after idle minutes'),
+        ),
+        migrations.AddField(
+            model_name='userenvironment',
+            name='last_launched',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userenvironment',
+            name='stopped',
+            field=models.BooleanField(default=False),
+        ),
+    ]
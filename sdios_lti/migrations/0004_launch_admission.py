@@ -0,0 +1,36 @@
+# Generated by Django 2.2.5 on 2026-10-19 11:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0003_idle_reaping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumer',
+            name='max_concurrent_launches',
+            field=models.PositiveIntegerField(blank=True, help_text='Launches from this consumer which may be in progress at once.  Leave blank for no limit.', null=True),
+        ),
+        migrations.AddField(
+            model_name='environmentmap',
+            name='max_concurrent_launches',
+            field=models.PositiveIntegerField(blank=True, help_text='Launches of this SDI which may be in progress at once.  Leave blank for no limit.', null=True),
+        ),
+        migrations.CreateModel(
+            name='LaunchTicket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('admitted', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('consumer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.Consumer')),
+                ('environment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.EnvironmentMap')),
+            ],
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.5 on 2026-10-19 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_backends(apps, schema_editor):
+    """
+    Name any existing backends, and place existing users on the
+    default backend, which is the only one they could have been using.
+    """
+
+    Setting = apps.get_model('sdios_lti', 'Setting')
+    UserMap = apps.get_model('sdios_lti', 'UserMap')
+
+    backends = list(Setting.objects.order_by('pk'))
+    for backend in backends[1:]:
+        backend.name = 'backend-{}'.format(backend.pk)
+        backend.save()
+
+    if UserMap.objects.exists():
+        default = backends[0] if backends else Setting.objects.create()
+        UserMap.objects.update(backend=default)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0004_launch_admission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='setting',
+            name='name',
+            field=models.CharField(default='default', help_text='A name identifying this SDI OS backend.', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='setting',
+            name='is_active',
+            field=models.BooleanField(default=True, help_text='Whether new LTI users may be placed on this backend.', verbose_name='Accepts new users'),
+        ),
+        migrations.AddField(
+            model_name='usermap',
+            name='backend',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='sdios_lti.Setting'),
+        ),
+        migrations.RunPython(assign_backends, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='setting',
+            name='name',
+            field=models.CharField(default='default', help_text='A name identifying this SDI OS backend.', max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='usermap',
+            name='backend',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='sdios_lti.Setting'),
+        ),
+        migrations.CreateModel(
+            name='EnvironmentReplica',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sdios_environment_uuid', models.CharField(max_length=36, unique=True)),
+                ('backend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.Setting')),
+                ('environment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.EnvironmentMap')),
+            ],
+            options={
+                'unique_together': {('environment', 'backend')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.16 on 2026-10-19 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0005_backends'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='setting',
+            name='users_etag',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='setting',
+            name='users_synced',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SdiosUser',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sdios_pk', models.IntegerField()),
+                ('username', models.CharField(max_length=255)),
+                ('tenancy', models.CharField(blank=True, default='', max_length=255)),
+                ('is_active', models.BooleanField(default=True)),
+                ('verified', models.DateTimeField(default=django.utils.timezone.now)),
+                ('backend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.setting')),
+            ],
+            options={
+                'unique_together': {('backend', 'sdios_pk'), ('backend', 'username')},
+            },
+        ),
+    ]
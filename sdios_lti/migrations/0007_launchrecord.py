@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-19 14:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0006_sdiosuser'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaunchRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('succeeded', models.BooleanField(default=False)),
+                ('failure', models.CharField(blank=True, default='', max_length=255)),
+                ('validate_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('queue_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('connect_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('user_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('login_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('total_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('consumer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='sdios_lti.consumer')),
+                ('environment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='sdios_lti.environmentmap')),
+                ('usermap', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='sdios_lti.usermap')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.16 on 2026-10-19 15:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0007_launchrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('params', models.JSONField(default=dict)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('is_dead', models.BooleanField(default=False)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'index_together': {('is_dead', 'run_after')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.16 on 2026-10-19 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0008_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseContext',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('context_id', models.CharField(max_length=255)),
+                ('title', models.CharField(blank=True, default='', max_length=255)),
+                ('last_launch', models.DateTimeField(default=django.utils.timezone.now)),
+                ('consumer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.consumer')),
+            ],
+            options={
+                'unique_together': {('consumer', 'context_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseMember',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_learner', models.BooleanField(default=True)),
+                ('last_launch', models.DateTimeField(default=django.utils.timezone.now)),
+                ('context', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.coursecontext')),
+                ('usermap', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.usermap')),
+            ],
+            options={
+                'unique_together': {('context', 'usermap')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseEnvironment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_launch', models.DateTimeField(default=django.utils.timezone.now)),
+                ('context', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.coursecontext')),
+                ('environment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sdios_lti.environmentmap')),
+            ],
+            options={
+                'unique_together': {('context', 'environment')},
+            },
+        ),
+    ]
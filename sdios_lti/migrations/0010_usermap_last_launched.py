@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-20 10:00
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_last_launched(apps, schema_editor):
+    """
+    Take each existing user's last launch from their launch records and
+    copies, whichever is later.  Users with neither are left unknown.
+    """
+
+    UserMap = apps.get_model('sdios_lti', 'UserMap')
+
+    usermaps = UserMap.objects.annotate(last_record=Max('launchrecord__created', filter=models.Q(launchrecord__succeeded=True)), last_copy=Max('userenvironment__last_launched'))
+    for usermap in usermaps.iterator():
+        launches = [launch for launch in (usermap.last_record, usermap.last_copy) if launch is not None]
+        if launches:
+            UserMap.objects.filter(pk=usermap.pk).update(last_launched=max(launches))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0009_course_contexts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermap',
+            name='last_launched',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_last_launched, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-20 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sdios_lti', '0010_usermap_last_launched'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userenvironment',
+            name='prepared',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,15 @@
+import asyncio
+import datetime
+import hashlib
 import os
 import random
 import string
 import time
 
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import models, router, transaction
+from django.utils import timezone
 
 
 class Consumer(models.Model):
@@ -16,6 +22,7 @@ class Consumer(models.Model):
     name = models.CharField(max_length=100, unique=True)
     key = models.CharField(max_length=255, unique=True)
     secret = models.CharField(max_length=64)
+    max_concurrent_launches = models.PositiveIntegerField(null=True, blank=True, help_text="Launches from this consumer which may be in progress at once.  Leave blank for no limit.")
 
     @staticmethod
     def get_consumer(consumer_key):
@@ -72,10 +79,97 @@ class EnvironmentMap(models.Model):
     name = models.CharField("LTI SDI Name", max_length=255, unique=True, help_text="Ensure the SDI name has not been used before.")
     sdios_environment_uuid = models.CharField(max_length=36, unique=True)
     lti_environment_key = models.CharField("LTI SDI Key", max_length=255, unique=True)
+    source_version = models.CharField("Source version", max_length=255, blank=True, default="", help_text="Change this to make users receive a fresh copy of the SDI.  Leave blank to detect changes from SDI OS.")
+    idle_stop_minutes = models.PositiveIntegerField("Stop after idle minutes", null=True, blank=True, help_text="Stop user copies this long after their last launch.  Leave blank for the site default.")
+    idle_delete_minutes = models.PositiveIntegerField("Delete after idle minutes", null=True, blank=True, help_text="Delete user copies this long after their last launch.  Leave blank for the site default.")
+    max_concurrent_launches = models.PositiveIntegerField(null=True, blank=True, help_text="Launches of this SDI which may be in progress at once.  Leave blank for no limit.")
+
+    # Fields of the SDI OS representation of an SDI which change when
+    # the SDI is modified.  Whichever of these are present are used to
+    # fingerprint the source SDI.
+    SOURCE_VERSION_FIELDS = ("version", "modified", "last_modified", "updated")
 
     def __str__(self):
         return "{} ({} -> {})".format(self.name, self.lti_environment_key, self.sdios_environment_uuid)
 
+    def get_source_version(self, source):
+        """
+        Return a string identifying the current version of the source
+        SDI.  A manually configured version takes precedence over the
+        SDI OS metadata.  If no version can be determined, an empty
+        string is returned, meaning user copies can never be reused.
+
+        :param source: The SDI OS API's representation of the source
+            SDI.
+        :type source: dict
+        :returns: A version fingerprint, or an empty string.
+        :rtype: string
+        """
+
+        if self.source_version:
+            return "manual:{}".format(self.source_version)
+
+        metadata = ["{}={}".format(field, source[field]) for field in self.SOURCE_VERSION_FIELDS if source.get(field) is not None]
+        if not metadata:
+            return ""
+
+        return "sdios:{}".format(hashlib.sha1("&".join(metadata).encode()).hexdigest())
+
+    def get_idle_thresholds(self):
+        """
+        Return how long user copies of this environment may sit idle
+        before being stopped and deleted, falling back to the
+        `LTI_IDLE_STOP_MINUTES` and `LTI_IDLE_DELETE_MINUTES` settings.
+        A threshold of `None` means never.
+
+        :returns: A (stop, delete) pair of thresholds.
+        :rtype: tuple of :class:`datetime.timedelta` or `None`
+        """
+
+        def threshold(minutes, default):
+            minutes = default if minutes is None else minutes
+            return None if minutes is None else datetime.timedelta(minutes=minutes)
+
+        return (threshold(self.idle_stop_minutes, settings.LTI_IDLE_STOP_MINUTES),
+                threshold(self.idle_delete_minutes, settings.LTI_IDLE_DELETE_MINUTES))
+
+    def get_source_uuid(self, backend):
+        """
+        Return the UUID of the source environment on the specified
+        SDI OS backend.  This is the environment's replica on that
+        backend if one has been configured, or the exported environment
+        itself otherwise.
+
+        :param backend: The SDI OS backend.
+        :type backend: :class:`Setting`
+        :returns: The UUID of the source environment.
+        :rtype: string
+        """
+
+        try:
+            return self.environmentreplica_set.get(backend=backend).sdios_environment_uuid
+        except EnvironmentReplica.DoesNotExist:
+            return self.sdios_environment_uuid
+
+
+class EnvironmentReplica(models.Model):
+    """
+    When several SDI OS backends are in use, each exported environment
+    must exist on every backend which users may be placed on.  Entries
+    in this table map an exported environment to its copy on another
+    backend.
+    """
+
+    environment = models.ForeignKey(EnvironmentMap, on_delete=models.CASCADE)
+    backend = models.ForeignKey("Setting", on_delete=models.CASCADE)
+    sdios_environment_uuid = models.CharField(max_length=36, unique=True)
+
+    class Meta:
+        unique_together = ("environment", "backend")
+
+    def __str__(self):
+        return "{} @ {} ({})".format(self.environment.name, self.backend.name, self.sdios_environment_uuid)
+
 
 class UserMap(models.Model):
     """
@@ -84,12 +178,17 @@ class UserMap(models.Model):
     the SDI OS instance so that the LMS user has an account.
     Entries in this table map consumer/user ID pairs to SDI OS
     users.
+
+    Each user is placed on one SDI OS backend when it is created and
+    stays there for good.
     """
 
     consumer = models.ForeignKey(Consumer, on_delete=models.CASCADE)
+    backend = models.ForeignKey("Setting", on_delete=models.PROTECT)
     lti_user_id = models.CharField(max_length=255)
     sdios_username = models.CharField(max_length=255, unique=True)
     sdios_password = models.CharField(max_length=255)
+    last_launched = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         unique_together = ("consumer", "lti_user_id")
@@ -97,6 +196,26 @@ class UserMap(models.Model):
     def __str__(self):
         return "{} -> {} ({})".format(self.consumer, self.lti_user_id, self.sdios_username)
 
+    @staticmethod
+    def get_backend(consumer, lti_user_id):
+        """
+        Return the SDI OS backend which the specified consumer/user ID
+        pair lives on.  Users who have not been seen before are placed
+        on a backend according to `LTI_BACKEND_PLACEMENT`.
+
+        :param consumer: An LTI consumer key.
+        :type consumer: string
+        :param lti_user_id: An LTI user ID as passed in by the LMS.
+        :type lti_user_id: string
+        :returns: An SDI OS backend.
+        :rtype: :class:`Setting`
+        """
+
+        try:
+            return UserMap.__find(consumer__key=consumer, lti_user_id=lti_user_id).backend
+        except UserMap.DoesNotExist:
+            return Setting.place("{}:{}".format(consumer, lti_user_id))
+
     @staticmethod
     def get_sdios_user(api, usermap):
         """
@@ -104,6 +223,11 @@ class UserMap(models.Model):
         SDI OS API) corresponding to the specified user map
         entry.  If no such user exists, return `None`.
 
+        Users are looked up in the local mirror of SDI OS users (see
+        :class:`SdiosUser`).  Entries which have not been verified in
+        the last `LTI_USER_MIRROR_MAX_AGE` seconds are verified against
+        SDI OS first.
+
         :param api: An API object.
         :type api: :class:`APIRequest`
         :param usermap: The user mapping to look up.
@@ -113,9 +237,57 @@ class UserMap(models.Model):
         :rtype: dict or `None`
         """
 
-        users = [e for e in api.get("accounts/users") if e["username"] == usermap.sdios_username]
+        mirrored = SdiosUser.lookup(api.backend, usermap.sdios_username)
+        if mirrored is not None and mirrored.is_fresh():
+            return mirrored.as_api()
+
+        # Verify a stale entry with a single lookup, falling back to
+        # listing all users if that fails.
+        if mirrored is not None:
+            try:
+                user = api.get("accounts/users/{}".format(mirrored.sdios_pk))
+                if user and user["username"] == usermap.sdios_username:
+                    return SdiosUser.store(api.backend, user).as_api()
+            except Exception:
+                pass
+
+        user = next(api.stream("accounts/users", lambda e: e["username"] == usermap.sdios_username), None)
+        if user is not None:
+            return SdiosUser.store(api.backend, user).as_api()
+
+        SdiosUser.forget(api.backend, usermap.sdios_username)
+
+    @staticmethod
+    async def get_sdios_user_async(api, usermap):
+        """
+        Asynchronous version of :meth:`get_sdios_user`.
+
+        :param api: An API object.
+        :type api: :class:`AsyncAPIRequest`
+        :param usermap: The user mapping to look up.
+        :type usermap: :class:`UserMap`
+        :returns: The SDI OS API's representation of the
+            specified user, or `None` if no such user exists.
+        :rtype: dict or `None`
+        """
+
+        mirrored = await sync_to_async(SdiosUser.lookup)(api.backend, usermap.sdios_username)
+        if mirrored is not None and mirrored.is_fresh():
+            return mirrored.as_api()
+
+        if mirrored is not None:
+            try:
+                user = await api.get("accounts/users/{}".format(mirrored.sdios_pk))
+                if user and user["username"] == usermap.sdios_username:
+                    return (await sync_to_async(SdiosUser.store)(api.backend, user)).as_api()
+            except Exception:
+                pass
+
+        users = [e async for e in api.stream("accounts/users", lambda e: e["username"] == usermap.sdios_username)]
         if users:
-            return users[0]
+            return (await sync_to_async(SdiosUser.store)(api.backend, users[0])).as_api()
+
+        await sync_to_async(SdiosUser.forget)(api.backend, usermap.sdios_username)
 
     @staticmethod
     def get(api, consumer, lti_user_id):
@@ -123,7 +295,9 @@ class UserMap(models.Model):
         Get a :class:`UserMap` instance corresponding to the specified
         consumer/user ID pair.  If such a mapping does not exist, a new
         SDI OS user and associated mapping entry are created
-        first.
+        first.  If the mapping exists but its SDI OS user does not, the
+        user is created again with the same credentials; mappings are
+        otherwise left for the `reconcile_sdios` command to clean up.
 
         :param api: An API object.
         :type api: :class:`APIRequest`
@@ -140,32 +314,128 @@ class UserMap(models.Model):
         default_tenancy = api.get("system/settings/")["default_tenancy"]
 
         try:
-            usermap = UserMap.objects.get(consumer=consumer, lti_user_id=lti_user_id)
-            if UserMap.get_sdios_user(api, usermap) is None:
-                usermap.delete()
-                raise UserMap.DoesNotExist
+            usermap = UserMap.__find(consumer=consumer, lti_user_id=lti_user_id)
+            user = UserMap.get_sdios_user(api, usermap)
         except UserMap.DoesNotExist:
-            def __get_rand_chars(strg, leng):
-                return "".join(random.choice(strg) for x in range(leng))
+            usermap = UserMap.__new(api, consumer, lti_user_id)
+            user = None
 
-            sdios_username = "SDIOS-LTI-{}".format(os.urandom(8).hex())
-            rand_chars = __get_rand_chars(string.ascii_letters, 10) + __get_rand_chars(string.digits, 3) + __get_rand_chars(string.punctuation, 3)
-            sdios_password = "".join(random.sample(rand_chars, len(rand_chars)))
+        user_params = UserMap.__user_params(usermap.sdios_username, usermap.sdios_password, default_tenancy)
 
-            user_params = UserMap.__user_params(sdios_username, sdios_password, default_tenancy)
-            api.post("accounts/users", user_params)
-            usermap = UserMap(consumer=consumer, lti_user_id=lti_user_id, sdios_username=sdios_username, sdios_password=sdios_password)
+        if user is None:
+            user = api.post("accounts/users", user_params)
             usermap.save()
+            if user and "pk" in user:
+                SdiosUser.store(api.backend, user)
+        else:
+            # Ensure the user has the proper settings.  This is not
+            # necessary unless user parameters (see __user_params)
+            # change *after* users have already been created, so it is
+            # left to a background job rather than holding up the launch.
+            Job.enqueue("update_sdios_user", UserMap.__update_params(usermap, user, default_tenancy))
+
+        return usermap
+
+    @staticmethod
+    async def get_async(api, consumer, lti_user_id):
+        """
+        Asynchronous version of :meth:`get`.  Database access is run in
+        a worker thread.
+
+        :param api: An API object.
+        :type api: :class:`AsyncAPIRequest`
+        :param consumer: An LTI consumer.
+        :type consumer: string
+        :param lti_user_id: An LTI user ID as passed in by the LMS.
+        :type lti_user_id: string
+        :returns: A user mapping entry.
+        :rtype: :class:`UserMap`
+        """
+
+        consumer = await sync_to_async(Consumer.get_consumer)(consumer)
+
+        default_tenancy = (await api.get("system/settings/"))["default_tenancy"]
+
+        try:
+            usermap = await sync_to_async(UserMap.__find)(consumer=consumer, lti_user_id=lti_user_id)
+            user = await UserMap.get_sdios_user_async(api, usermap)
+        except UserMap.DoesNotExist:
+            usermap = UserMap.__new(api, consumer, lti_user_id)
+            user = None
 
-        # Ensure the user has the proper settings.  This is not
-        # necessary unless user parameters (see __user_params) change
-        # *after* users have already been created.
-        user = UserMap.get_sdios_user(api, usermap)
         user_params = UserMap.__user_params(usermap.sdios_username, usermap.sdios_password, default_tenancy)
-        api.put("accounts/users/{}".format(user["pk"]), user_params)
+
+        if user is None:
+            user = await api.post("accounts/users", user_params)
+            await sync_to_async(usermap.save)()
+            if user and "pk" in user:
+                await sync_to_async(SdiosUser.store)(api.backend, user)
+        else:
+            await sync_to_async(Job.enqueue)("update_sdios_user", UserMap.__update_params(usermap, user, default_tenancy))
 
         return usermap
 
+    @staticmethod
+    def update_sdios_user(api, usermap, user_pk, tenancy):
+        """
+        Bring the settings of a user's SDI OS account up to date.
+
+        :param api: An API object.
+        :type api: :class:`APIRequest`
+        :param usermap: The user mapping whose account to update.
+        :type usermap: :class:`UserMap`
+        :param user_pk: The SDI OS user's ID.
+        :type user_pk: int
+        :param tenancy: The tenancy the user belongs in.
+        :type tenancy: int
+        """
+
+        api.put("accounts/users/{}".format(user_pk), UserMap.__user_params(usermap.sdios_username, usermap.sdios_password, tenancy))
+
+    @staticmethod
+    def __update_params(usermap, user, tenancy):
+        return {"usermap": usermap.pk, "user": user["pk"], "tenancy": tenancy}
+
+    def record_launch(self):
+        """
+        Record that the user has just launched an environment.  This is
+        kept on the mapping itself, rather than taken from their copies,
+        since copies may be reaped while the user is still active.
+        """
+
+        self.last_launched = timezone.now()
+        UserMap.objects.filter(pk=self.pk).update(last_launched=self.last_launched)
+
+    @staticmethod
+    def __find(**lookup):
+        """
+        Return the mapping matching `lookup`.  A mapping missing from a
+        read replica may just not have reached it yet, so the primary
+        database is checked before :class:`UserMap.DoesNotExist` is
+        raised, to avoid creating the user twice.
+        """
+
+        try:
+            return UserMap.objects.select_related("backend").get(**lookup)
+        except UserMap.DoesNotExist:
+            return UserMap.objects.db_manager(router.db_for_write(UserMap)).select_related("backend").get(**lookup)
+
+    @staticmethod
+    def __new(api, consumer, lti_user_id):
+        """
+        Return a new, unsaved :class:`UserMap` with a random SDI OS
+        username and password, on the backend used by `api`.
+        """
+
+        def __get_rand_chars(strg, leng):
+            return "".join(random.choice(strg) for x in range(leng))
+
+        sdios_username = "SDIOS-LTI-{}".format(os.urandom(8).hex())
+        rand_chars = __get_rand_chars(string.ascii_letters, 10) + __get_rand_chars(string.digits, 3) + __get_rand_chars(string.punctuation, 3)
+        sdios_password = "".join(random.sample(rand_chars, len(rand_chars)))
+
+        return UserMap(consumer=consumer, backend=api.backend, lti_user_id=lti_user_id, sdios_username=sdios_username, sdios_password=sdios_password)
+
     @staticmethod
     def __user_params(username, password, tenancy):
         return {
@@ -210,81 +480,907 @@ class UserMap(models.Model):
         :rtype: string
         """
 
+        user, environment, environments = UserMap.prepare(api, usermap, source_environment)
+        usermap.record_launch()
+
+        # Stop all environments belonging to this user, except for the
+        # just-copied environment.  The user need not wait for this.
+        Job.enqueue("stop_sdi", *UserMap.__stop_params(api, user, source_environment, environments))
+
+        url = api.post("accounts/login/token", {"user": user["pk"]})["url"]
+
+        return UserMap.__login_url(api, url, environment)
+
+    @staticmethod
+    def prepare(api, usermap, source_environment, ahead=False):
+        """
+        Make sure a user has a current copy of an environment, copying
+        the source environment into the user's SDI OS account if not.
+        This is done by :meth:`login`, and ahead of launches for members
+        of active courses (see :class:`CourseEnvironment`).  A copy made
+        ahead of a launch is recorded as prepared rather than launched.
+
+        Ahead of a launch, the user's record of the copy is claimed
+        before SDI OS is asked for anything, and nothing is done if the
+        user already has a record.  Launches wait for a claimed copy to
+        be made rather than copying at the same time (see
+        :meth:`UserEnvironment.get_for`).  An existing copy is never
+        deleted ahead of a launch, since the user may be using it.
+
+        :param api: An API object.
+        :type api: :class:`APIRequest`
+        :param usermap: A mapping for the desired user.
+        :type usermap: :class:`UserMap`
+        :param source_environment: The environment to copy.
+        :type source_environment: :class:`EnvironmentMap`
+        :param ahead: Whether this is ahead of a launch.
+        :type ahead: bool
+        :returns: The SDI OS API's representations of the user, their
+            copy, and the environments relevant to the launch, or None
+            if the preparation was skipped.
+        :rtype: tuple
+        """
+
+        if not ahead:
+            return UserMap.__prepare(api, usermap, source_environment, UserEnvironment.get_for(usermap, source_environment), ahead)
+
+        copy = UserEnvironment.claim(usermap, source_environment)
+        if copy is None:
+            return None
+
+        try:
+            return UserMap.__prepare(api, usermap, source_environment, copy, ahead)
+        except Exception:
+            # Give up the claim, so that launches need not wait for it
+            # and the job can claim it again when retried.
+            copy.release()
+            raise
+
+    @staticmethod
+    def __prepare(api, usermap, source_environment, copy, ahead):
+        """
+        Make the user's copy for :meth:`prepare`.
+        """
+
         user = UserMap.get_sdios_user(api, usermap)
 
-        environments = api.get("sdis")
+        if user is None:
+            raise Exception
+
+        # Only the source environment and the user's own environments
+        # are of interest, so only those are kept from the SDI list.
+        source_uuid = source_environment.get_source_uuid(api.backend)
+        relevant = UserMap.__relevant_environments(source_uuid, user)
+
+        environments = list(api.stream("sdis", relevant))
+        source_version = UserMap.__source_version(source_environment, source_uuid, environments)
+        user_environment = [e for e in environments if e["name"] == source_environment.name and e["user"] == user["pk"]]
+
+        # The user's existing copy can be reused if it was made from the
+        # current version of the source environment.
+        if not copy.is_current(user_environment, source_version):
+            # If the desired target environment already exists, try
+            # deleting it.  This will fail if the environment does not
+            # exist (i.e. this is the user's first visit) or if the
+            # environment is running.  If the environment is running, we
+            # want to reuse that anyway, so failure to delete is OK.
+            # Ahead of a launch it is left alone, so copying then fails
+            # and it is recorded as not current.
+            if user_environment and not ahead:
+                try:
+                    api.delete("sdis/{}".format(user_environment[0]["sdi_id"]))
+                except Exception:
+                    pass
+
+            # Try copying the source environment to the target
+            # environment.  This can fail is the source environment is
+            # running of if the target environment exists.  In that case
+            # the copy is not known to be current, so forget its version.
+            copy.source_version = ""
+            try:
+                api.post("sdis/{}/copy".format(source_uuid), UserMap.__copy_params(user, source_environment))
+                copy.source_version = source_version
+                # Copying is done asynchronously, so there is a slight
+                # race after a copy: it could still be in a pending state
+                # after returning.  Because no images are being copied,
+                # assume the copy runs quickly enough that a 2 second
+                # delay will avoid the race.
+                time.sleep(2)
+            except Exception:
+                pass
+
+            environments = list(api.stream("sdis", relevant))
+
+        # This will fail if the environment does not exist, which is
+        # possible if the source environment was running and this is the
+        # user's first login attempt.
+        environment = [e for e in environments if e["user"] == int(user["pk"]) and e["name"] == source_environment.name][0]
+
+        if ahead:
+            copy.record_preparation(environment)
+        else:
+            copy.record_launch(environment)
+
+        return user, environment, environments
+
+    @staticmethod
+    async def login_async(api, usermap, source_environment):
+        """
+        Asynchronous version of :meth:`login`.  Database access is run
+        in a worker thread.
+
+        :param api: An API object.
+        :type api: :class:`AsyncAPIRequest`
+        :param usermap: A mapping for the desired user.
+        :type usermap: :class:`UserMap`
+        :param source_environment: The environment to copy.
+        :type source_environment: :class:`EnvironmentMap`
+        :returns: A URL which will take the user to the environment.
+        :rtype: string
+        """
+
+        user = await UserMap.get_sdios_user_async(api, usermap)
 
         if user is None:
             raise Exception
 
-        try:
-            source_user = [e for e in environments if e["sdi_id"] == source_environment.sdios_environment_uuid][0]["user"]
-        except IndexError:
-            source_environment.delete()
-            raise
+        source_uuid = await sync_to_async(source_environment.get_source_uuid)(api.backend)
+        relevant = UserMap.__relevant_environments(source_uuid, user)
 
-        # If the desired target environment already exists, try deleting
-        # it.  This will fail if the environment does not exist (i.e.
-        # this is the user's first visit) or if the environment is
-        # running.  If the environment is running, we want to reuse that
-        # anyway, so failure to delete is OK.
+        environments = [e async for e in api.stream("sdis", relevant)]
+        source_version = UserMap.__source_version(source_environment, source_uuid, environments)
         user_environment = [e for e in environments if e["name"] == source_environment.name and e["user"] == user["pk"]]
-        if user_environment:
+
+        copy = await UserEnvironment.get_for_async(usermap, source_environment)
+
+        if not copy.is_current(user_environment, source_version):
+            if user_environment:
+                try:
+                    await api.delete("sdis/{}".format(user_environment[0]["sdi_id"]))
+                except Exception:
+                    pass
+
+            copy.source_version = ""
             try:
-                api.delete("sdis/{}".format(user_environment[0]["sdi_id"]))
+                await api.post("sdis/{}/copy".format(source_uuid), UserMap.__copy_params(user, source_environment))
+                copy.source_version = source_version
+                await asyncio.sleep(2)
             except Exception:
                 pass
 
-        env_data = {
+            environments = [e async for e in api.stream("sdis", relevant)]
+
+        environment = [e for e in environments if e["user"] == int(user["pk"]) and e["name"] == source_environment.name][0]
+
+        await sync_to_async(copy.record_launch)(environment)
+        await sync_to_async(usermap.record_launch)()
+
+        await sync_to_async(Job.enqueue)("stop_sdi", *UserMap.__stop_params(api, user, source_environment, environments))
+
+        url = (await api.post("accounts/login/token", {"user": user["pk"]}))["url"]
+
+        return UserMap.__login_url(api, url, environment)
+
+    @staticmethod
+    def __relevant_environments(source_uuid, user):
+        """
+        Return a predicate selecting the environments a launch needs: the
+        source environment, and those belonging to the user.
+        """
+
+        return lambda e: e["sdi_id"] == source_uuid or e["user"] == user["pk"]
+
+    @staticmethod
+    def __source_version(source_environment, source_uuid, environments):
+        """
+        Find the source environment among `environments` and return its
+        version.  If the source does not exist, :class:`IndexError` is
+        raised; the `reconcile_sdios` command removes such environments.
+        """
+
+        source = [e for e in environments if e["sdi_id"] == source_uuid][0]
+
+        return source_environment.get_source_version(source)
+
+    @staticmethod
+    def __stop_params(api, user, source_environment, environments):
+        """
+        Return parameters for jobs stopping each of the user's
+        environments other than the one being launched.
+        """
+
+        return [{"backend": api.backend.pk, "sdi_id": e["sdi_id"]} for e in environments if e["user"] == user["pk"] and e["name"] != source_environment.name]
+
+    @staticmethod
+    def __copy_params(user, source_environment):
+        return {
             "name": source_environment.name,
             "user": int(user["pk"]),
             "remove_persistence": True,
         }
 
-        # Try copying the source environment to the target environment.
-        # This can fail is the source environment is running of if the
-        # target environment exists.
+    @staticmethod
+    def __login_url(api, url, environment):
+        return "{}?next={}".format(url, environment["url"].split(api.backend.sdios_url)[1])
+
+
+class UserEnvironment(models.Model):
+    """
+    Each time a user is given a copy of an LTI environment, the version
+    of the source environment it was copied from is recorded here.  As
+    long as the source environment has not changed, the copy is reused
+    on later launches instead of being copied again.
+
+    The time of the last launch, or of preparation for a copy made
+    ahead of a launch, is also recorded so that idle copies can be
+    stopped or deleted by the `reap_environments` command.
+    """
+
+    usermap = models.ForeignKey(UserMap, on_delete=models.CASCADE)
+    environment = models.ForeignKey(EnvironmentMap, on_delete=models.CASCADE)
+    sdios_environment_uuid = models.CharField(max_length=36)
+    source_version = models.CharField(max_length=255, blank=True, default="")
+    last_launched = models.DateTimeField(null=True, blank=True)
+    prepared = models.DateTimeField(null=True, blank=True)
+    stopped = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ("usermap", "environment")
+
+    def __str__(self):
+        return "{} -> {} ({})".format(self.usermap.sdios_username, self.environment.name, self.sdios_environment_uuid)
+
+    @staticmethod
+    def get_for(usermap, environment):
+        """
+        Return the record of the specified user's copy of the specified
+        environment, saving a new record if the user has no copy yet.
+        If the copy is being prepared ahead of the launch, this waits
+        up to `LTI_CONTEXT_PREPARE_WAIT` seconds for it to be made.
+
+        :param usermap: The user.
+        :type usermap: :class:`UserMap`
+        :param environment: The copied environment.
+        :type environment: :class:`EnvironmentMap`
+        :rtype: :class:`UserEnvironment`
+        """
+
+        deadline = time.monotonic() + settings.LTI_CONTEXT_PREPARE_WAIT
+        while True:
+            copy = UserEnvironment.objects.get_or_create(usermap=usermap, environment=environment)[0]
+            if not copy.is_being_prepared() or time.monotonic() >= deadline:
+                return copy
+            time.sleep(1)
+
+    @staticmethod
+    async def get_for_async(usermap, environment):
+        """
+        Asynchronous version of :meth:`get_for`.
+
+        :param usermap: The user.
+        :type usermap: :class:`UserMap`
+        :param environment: The copied environment.
+        :type environment: :class:`EnvironmentMap`
+        :rtype: :class:`UserEnvironment`
+        """
+
+        deadline = time.monotonic() + settings.LTI_CONTEXT_PREPARE_WAIT
+        while True:
+            copy = (await sync_to_async(UserEnvironment.objects.get_or_create)(usermap=usermap, environment=environment))[0]
+            if not copy.is_being_prepared() or time.monotonic() >= deadline:
+                return copy
+            await asyncio.sleep(1)
+
+    @staticmethod
+    def claim(usermap, environment):
+        """
+        Claim the specified user's copy of the specified environment, to
+        be prepared ahead of their launch.  The claim is saved straight
+        away, so that launches see it while the copy is being made.
+
+        :param usermap: The user.
+        :type usermap: :class:`UserMap`
+        :param environment: The copied environment.
+        :type environment: :class:`EnvironmentMap`
+        :returns: The claimed record, or `None` if the user already has
+            a record of a copy.
+        :rtype: :class:`UserEnvironment` or `None`
+        """
+
+        copy, created = UserEnvironment.objects.get_or_create(usermap=usermap, environment=environment, defaults={"prepared": timezone.now()})
+        return copy if created else None
+
+    def is_being_prepared(self):
+        """
+        Return whether this record is a claim on a copy which is still
+        being prepared.  Claims older than `LTI_CONTEXT_PREPARE_WAIT`
+        seconds are assumed to have been abandoned.
+
+        :rtype: bool
+        """
+
+        return (not self.sdios_environment_uuid and self.prepared is not None and
+                self.prepared >= timezone.now() - datetime.timedelta(seconds=settings.LTI_CONTEXT_PREPARE_WAIT))
+
+    def release(self):
+        """
+        Give up a claim made by :meth:`claim` whose copy was not made.
+        """
+
+        UserEnvironment.objects.filter(pk=self.pk, sdios_environment_uuid="").delete()
+
+    def is_current(self, user_environment, source_version):
+        """
+        Return whether the user's copy, as found on SDI OS, was made
+        from the specified version of the source environment.
+
+        :param user_environment: A list holding the SDI OS API's
+            representation of the user's copy, or an empty list if the
+            user has no copy.
+        :type user_environment: list
+        :param source_version: The current version of the source.
+        :type source_version: string
+        :rtype: bool
+        """
+
+        return bool(user_environment and source_version and self.source_version == source_version and
+                    self.sdios_environment_uuid == user_environment[0]["sdi_id"])
+
+    def record_launch(self, environment):
+        """
+        Record that the user has just launched their copy.
+
+        :param environment: The SDI OS API's representation of the copy.
+        :type environment: dict
+        """
+
+        self.sdios_environment_uuid = environment["sdi_id"]
+        self.last_launched = timezone.now()
+        self.stopped = False
+        self.save()
+
+    def record_preparation(self, environment):
+        """
+        Record that the copy has been made ahead of the user's launch.
+
+        :param environment: The SDI OS API's representation of the copy.
+        :type environment: dict
+        """
+
+        self.sdios_environment_uuid = environment["sdi_id"]
+        self.prepared = timezone.now()
+
+        # A launch which gave up waiting may have recorded the copy
+        # meanwhile, in which case its record stands.
+        UserEnvironment.objects.filter(pk=self.pk, sdios_environment_uuid="").update(
+            sdios_environment_uuid=self.sdios_environment_uuid, source_version=self.source_version, prepared=self.prepared)
+
+
+class CourseContext(models.Model):
+    """
+    A course (LTI context) from which users have launched, with the
+    users seen launching from it recorded as :class:`CourseMember`
+    entries and the environments launched from it as
+    :class:`CourseEnvironment` entries.
+    """
+
+    consumer = models.ForeignKey(Consumer, on_delete=models.CASCADE)
+    context_id = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, blank=True, default="")
+    last_launch = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("consumer", "context_id")
+
+    def __str__(self):
+        return "{} ({})".format(self.title or self.context_id, self.consumer)
+
+    @staticmethod
+    def record_launch(consumer, environment, usermap, context_id, title="", is_learner=True):
+        """
+        Record a launch of an environment from a course.  If the
+        environment has not been launched from the course before, or not
+        for `LTI_CONTEXT_SESSION_GAP_MINUTES` minutes, a job is queued to
+        give the course's learners copies ahead of their launches.
+
+        :param consumer: The launching consumer.
+        :type consumer: :class:`Consumer`
+        :param environment: The environment launched.
+        :type environment: :class:`EnvironmentMap`
+        :param usermap: The launching user.
+        :type usermap: :class:`UserMap`
+        :param context_id: The LTI context ID passed by the LMS.
+        :type context_id: string
+        :param title: The LTI context title passed by the LMS.
+        :type title: string
+        :param is_learner: Whether the user launched as a learner.
+        :type is_learner: bool
+        """
+
+        now = timezone.now()
+
+        context, _ = CourseContext.objects.update_or_create(consumer=consumer, context_id=context_id, defaults={"title": title, "last_launch": now})
+        CourseMember.objects.update_or_create(context=context, usermap=usermap, defaults={"is_learner": is_learner, "last_launch": now})
+
+        course_environment, created = CourseEnvironment.objects.get_or_create(context=context, environment=environment, defaults={"last_launch": now})
+        if created:
+            activated = True
+        else:
+            # Only one of several simultaneous launches starting a new
+            # session updates the launch time, and so queues the job.
+            cutoff = now - datetime.timedelta(minutes=settings.LTI_CONTEXT_SESSION_GAP_MINUTES)
+            activated = CourseEnvironment.objects.filter(pk=course_environment.pk, last_launch__lt=cutoff).update(last_launch=now) == 1
+            if not activated:
+                CourseEnvironment.objects.filter(pk=course_environment.pk).update(last_launch=now)
+
+        if activated:
+            Job.enqueue("prepare_course_environment", {"course_environment": course_environment.pk})
+
+
+class CourseMember(models.Model):
+    """
+    A user seen launching from a course.
+    """
+
+    context = models.ForeignKey(CourseContext, on_delete=models.CASCADE)
+    usermap = models.ForeignKey(UserMap, on_delete=models.CASCADE)
+    is_learner = models.BooleanField(default=True)
+    last_launch = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("context", "usermap")
+
+    def __str__(self):
+        return "{} in {}".format(self.usermap.lti_user_id, self.context)
+
+
+class CourseEnvironment(models.Model):
+    """
+    An environment launched from a course.  When it becomes active, by
+    being launched from the course for the first time or after a gap
+    (e.g. at the start of a lab session), learners seen in the course
+    who have no copy of it yet are given one in the background, so that
+    their own launches only need to log them in.
+    """
+
+    context = models.ForeignKey(CourseContext, on_delete=models.CASCADE)
+    environment = models.ForeignKey(EnvironmentMap, on_delete=models.CASCADE)
+    last_launch = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("context", "environment")
+
+    def __str__(self):
+        return "{} in {}".format(self.environment.name, self.context)
+
+    def unprepared_learners(self):
+        """
+        Return the learners in this environment's course who have no
+        copy of the environment, most recently active first, up to
+        `LTI_CONTEXT_PREPARE_LIMIT` of them.
+
+        :rtype: :class:`django.db.models.query.QuerySet`
+        """
+
+        copied = UserEnvironment.objects.filter(environment=self.environment).values("usermap")
+        members = CourseMember.objects.filter(context=self.context, is_learner=True).exclude(usermap__in=copied)
+
+        return members.select_related("usermap").order_by("-last_launch")[:settings.LTI_CONTEXT_PREPARE_LIMIT]
+
+
+class LaunchTicket(models.Model):
+    """
+    Every LTI launch takes a ticket before doing any work against
+    SDI OS.  Tickets are admitted in the order they were taken, as long
+    as the number of launches in progress stays within the global,
+    per-consumer and per-environment limits.  Finished tickets are kept
+    for a while to report on queue wait times.
+    """
+
+    consumer = models.ForeignKey(Consumer, on_delete=models.CASCADE)
+    environment = models.ForeignKey(EnvironmentMap, on_delete=models.CASCADE)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    admitted = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return "{} -> {} ({})".format(self.consumer, self.environment.name, self.created)
+
+    @staticmethod
+    def live():
+        """
+        Return all tickets which are waiting or in progress.  Tickets
+        older than `LTI_LAUNCH_TICKET_EXPIRY` seconds are assumed to
+        have been abandoned by a worker which died.
+
+        :returns: A queryset of live tickets.
+        :rtype: :class:`django.db.models.query.QuerySet`
+        """
+
+        cutoff = timezone.now() - datetime.timedelta(seconds=settings.LTI_LAUNCH_TICKET_EXPIRY)
+        return LaunchTicket.objects.filter(finished__isnull=True, created__gte=cutoff)
+
+    def try_admit(self):
+        """
+        Admit this ticket if doing so keeps every applicable limit.  A
+        ticket counts every live ticket ahead of it in the queue, as
+        well as any later ticket which has already been admitted, so
+        tickets are admitted fairly in order.  Against the global limit,
+        waiting tickets held back by their own consumer's or
+        environment's limit are not counted, so that one busy consumer
+        or environment does not hold up launches for the others.
+
+        :returns: Whether the ticket was admitted.
+        :rtype: bool
+        """
+
+        limits = (
+            (models.Q(consumer=self.consumer_id), self.consumer.max_concurrent_launches),
+            (models.Q(environment=self.environment_id), self.environment.max_concurrent_launches),
+        )
+
+        ahead = LaunchTicket.live().exclude(pk=self.pk).filter(models.Q(pk__lt=self.pk) | models.Q(admitted__isnull=False))
+        for scope, limit in limits:
+            if limit is not None and ahead.filter(scope).count() >= limit:
+                return False
+
+        if settings.LTI_MAX_CONCURRENT_LAUNCHES is not None:
+            in_progress = ahead.filter(admitted__isnull=False)
+            held_back = models.Q(admitted__isnull=True) & (models.Q(consumer__in=LaunchTicket.__at_limit(in_progress, "consumer")) |
+                                                           models.Q(environment__in=LaunchTicket.__at_limit(in_progress, "environment")))
+            if ahead.exclude(held_back).count() >= settings.LTI_MAX_CONCURRENT_LAUNCHES:
+                return False
+
+        self.admitted = timezone.now()
+        self.save(update_fields=["admitted"])
+        return True
+
+    @staticmethod
+    def __at_limit(in_progress, field):
+        """
+        Return the IDs of the consumers or environments, as named by
+        `field`, whose launches in progress have reached their limit.
+        """
+
+        limit = "{}__max_concurrent_launches".format(field)
+        counts = in_progress.values(field, limit).annotate(count=models.Count("pk"))
+        return [row[field] for row in counts if row[limit] is not None and row["count"] >= row[limit]]
+
+    def wait_ms(self):
+        """
+        Return how long this ticket waited to be admitted, in
+        milliseconds.
+
+        :rtype: int
+        """
+
+        return int((self.admitted - self.created).total_seconds() * 1000)
+
+    def finish(self):
+        """
+        Mark this ticket as finished, freeing its place for the next
+        ticket in the queue.
+        """
+
+        self.finished = timezone.now()
+        self.save(update_fields=["finished"])
+
+
+class SdiosUser(models.Model):
+    """
+    A local mirror of the users on each SDI OS backend, so that users
+    can be looked up without listing every user through the API.  The
+    mirror is kept up to date by the `sync_sdios_users` command, and
+    individual entries are refreshed whenever they are verified against
+    SDI OS.
+    """
+
+    backend = models.ForeignKey("Setting", on_delete=models.CASCADE)
+    sdios_pk = models.IntegerField()
+    username = models.CharField(max_length=255)
+    tenancy = models.CharField(max_length=255, blank=True, default="")
+    is_active = models.BooleanField(default=True)
+    verified = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = (("backend", "sdios_pk"), ("backend", "username"))
+
+    def __str__(self):
+        return "{} ({}) @ {}".format(self.username, self.sdios_pk, self.backend.name)
+
+    def is_fresh(self):
+        """
+        Return whether this entry was verified against SDI OS recently
+        enough to be trusted without checking again.
+
+        :rtype: bool
+        """
+
+        return self.verified >= timezone.now() - datetime.timedelta(seconds=settings.LTI_USER_MIRROR_MAX_AGE)
+
+    def as_api(self):
+        """
+        Return this user in the form returned by the SDI OS API, with
+        only the mirrored fields present.
+
+        :rtype: dict
+        """
+
+        return {
+            "pk": self.sdios_pk,
+            "username": self.username,
+            "tenancy": self.tenancy,
+            "is_active": self.is_active,
+        }
+
+    @staticmethod
+    def fields(user):
+        """
+        Return the mirrored fields of a user as returned by the SDI OS
+        API.
+
+        :param user: The SDI OS API's representation of a user.
+        :type user: dict
+        :rtype: dict
+        """
+
+        return {
+            "username": user["username"],
+            "tenancy": str(user.get("tenancy") or ""),
+            "is_active": user.get("is_active", True),
+        }
+
+    @staticmethod
+    def lookup(backend, username):
+        """
+        Return the mirrored user with the specified username, or `None`
+        if there is no such user in the mirror.
+
+        :param backend: The user's SDI OS backend.
+        :type backend: :class:`Setting`
+        :param username: The SDI OS username.
+        :type username: string
+        :rtype: :class:`SdiosUser` or `None`
+        """
+
         try:
-            api.post("sdis/{}/copy".format(source_environment.sdios_environment_uuid), env_data)
-            # Copying is done asynchronously, so there is a slight race
-            # after a copy: it could still be in a pending state after
-            # returning.  Because no images are being copied, assume the
-            # copy runs quickly enough that a 2 second delay will avoid
-            # the race.
-            time.sleep(2)
-        except Exception:
-            pass
+            return SdiosUser.objects.get(backend=backend, username=username)
+        except SdiosUser.DoesNotExist:
+            return None
 
-        environments = api.get("sdis")
+    @staticmethod
+    def store(backend, user):
+        """
+        Add or update a user in the mirror, marking it as just verified.
 
-        # This will fail if the environment does not exist, which is
-        # possible if the source environment was running and this is the
-        # user's first login attempt.
-        environment = [e for e in environments if e["user"] == int(user["pk"]) and e["name"] == source_environment.name][0]
+        :param backend: The user's SDI OS backend.
+        :type backend: :class:`Setting`
+        :param user: The SDI OS API's representation of the user.
+        :type user: dict
+        :rtype: :class:`SdiosUser`
+        """
 
-        # Stop all environments belonging to this user, except for the
-        # just-copied environment.
-        for env in [e for e in environments if e["user"] == user["pk"] and e["name"] != source_environment.name]:
-            api.post("sdis/{}/stop".format(env["sdi_id"]))
+        fields = SdiosUser.fields(user)
+        fields["verified"] = timezone.now()
 
-        url = api.post("accounts/login/token", {"user": user["pk"]})["url"]
-        url = "{}?next={}".format(url, environment["url"].split(Setting.get().sdios_url)[1])
+        # A username may have been reused by a user with a new pk.
+        SdiosUser.objects.filter(backend=backend, username=fields["username"]).exclude(sdios_pk=user["pk"]).delete()
+        return SdiosUser.objects.update_or_create(backend=backend, sdios_pk=user["pk"], defaults=fields)[0]
+
+    @staticmethod
+    def forget(backend, username):
+        """
+        Remove a user which no longer exists on SDI OS from the mirror.
+
+        :param backend: The user's SDI OS backend.
+        :type backend: :class:`Setting`
+        :param username: The SDI OS username.
+        :type username: string
+        """
+
+        SdiosUser.objects.filter(backend=backend, username=username).delete()
+
+    @staticmethod
+    def sync(api, full=False):
+        """
+        Bring the mirror of the users on the backend used by `api` up to
+        date.  The user list is requested conditionally, so if SDI OS
+        reports that it has not changed since the last sync (by ETag),
+        nothing is transferred.  Otherwise the full list is compared
+        with the mirror and only the differences are written.
+
+        :param api: An API object.
+        :type api: :class:`APIRequest`
+        :param full: If true, fetch the full list even if SDI OS reports
+            it unchanged.
+        :type full: bool
+        :returns: The number of users created, updated and deleted, or
+            `None` if the user list had not changed.
+        :rtype: tuple or `None`
+        """
+
+        users, etag = api.get_if_changed("accounts/users", None if full else api.backend.users_etag)
+        return SdiosUser.apply(api.backend, users, etag)
+
+    @staticmethod
+    def apply(backend, users, etag):
+        """
+        Bring the mirror of the users on the specified backend up to
+        date with a list of users fetched from it.  See :meth:`sync`.
+
+        :param backend: An SDI OS backend.
+        :type backend: :class:`Setting`
+        :param users: The SDI OS API's list of users (which may be an
+            iterator, consumed once), or `None` if it has not changed
+            since the last sync.
+        :type users: iterable or `None`
+        :param etag: The ETag of the list, if any.
+        :type etag: string or `None`
+        :returns: The number of users created, updated and deleted, or
+            `None` if the user list had not changed.
+        :rtype: tuple or `None`
+        """
+
+        now = timezone.now()
+
+        if users is None:
+            SdiosUser.objects.filter(backend=backend).update(verified=now)
+            return None
+
+        mirrored = {user.sdios_pk: user for user in SdiosUser.objects.filter(backend=backend)}
+        to_create = []
+        to_update = []
+        for user in users:
+            fields = SdiosUser.fields(user)
+            entry = mirrored.pop(user["pk"], None)
+            if entry is None:
+                to_create.append(SdiosUser(backend=backend, sdios_pk=user["pk"], verified=now, **fields))
+            elif any(getattr(entry, field) != value for field, value in fields.items()):
+                for field, value in fields.items():
+                    setattr(entry, field, value)
+                to_update.append(entry)
+
+        with transaction.atomic():
+            SdiosUser.objects.filter(pk__in=[entry.pk for entry in mirrored.values()]).delete()
+            # Renamed users are updated before new users are created, in
+            # case a new user has taken an old username.
+            SdiosUser.objects.bulk_update(to_update, ["username", "tenancy", "is_active"], batch_size=1000)
+            SdiosUser.objects.bulk_create(to_create, batch_size=1000)
+            SdiosUser.objects.filter(backend=backend).update(verified=now)
+
+            backend.users_etag = etag or ""
+            backend.users_synced = now
+            backend.save(update_fields=["users_etag", "users_synced"])
+
+        return len(to_create), len(to_update), len(mirrored)
+
+
+class LaunchRecord(models.Model):
+    """
+    Each LTI launch, successful or not, is recorded here with the time
+    spent in each of its phases, for reporting on launch volume and
+    latency.  Records are written in batches; see
+    :class:`sdios_lti.analytics.LaunchBuffer`.
+    """
+
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    consumer = models.ForeignKey(Consumer, null=True, blank=True, on_delete=models.SET_NULL)
+    environment = models.ForeignKey(EnvironmentMap, null=True, blank=True, on_delete=models.SET_NULL)
+    usermap = models.ForeignKey(UserMap, null=True, blank=True, on_delete=models.SET_NULL)
+    succeeded = models.BooleanField(default=False)
+    failure = models.CharField(max_length=255, blank=True, default="")
+    validate_ms = models.PositiveIntegerField(null=True, blank=True)
+    queue_ms = models.PositiveIntegerField(null=True, blank=True)
+    connect_ms = models.PositiveIntegerField(null=True, blank=True)
+    user_ms = models.PositiveIntegerField(null=True, blank=True)
+    login_ms = models.PositiveIntegerField(null=True, blank=True)
+    total_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return "{} {} ({} ms)".format(self.created, "succeeded" if self.succeeded else "failed", self.total_ms)
+
+
+class Job(models.Model):
+    """
+    A launch step which need not finish before the user is redirected,
+    such as stopping the user's other SDIs, is queued here and carried
+    out by the `run_jobs` command.  Handlers for each job name are in
+    :mod:`sdios_lti.jobs`.
+
+    A job is claimed by pushing `run_after` past the time it may take to
+    run, so that a job whose worker dies is picked up again.  Jobs are
+    deleted once they succeed.  Failed jobs are retried after an
+    increasing delay, and after `LTI_JOB_MAX_ATTEMPTS` attempts they are
+    marked dead and kept for inspection.
+    """
+
+    name = models.CharField(max_length=100)
+    params = models.JSONField(default=dict)
+    created = models.DateTimeField(default=timezone.now)
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    is_dead = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        index_together = ("is_dead", "run_after")
 
-        return url
+    def __str__(self):
+        return "{} {} ({} attempts{})".format(self.name, self.params, self.attempts, ", dead" if self.is_dead else "")
+
+    @staticmethod
+    def enqueue(name, *params):
+        """
+        Queue a job for each of the given parameter dicts.
+
+        :param name: The name of the job's handler.
+        :type name: string
+        :param params: Parameters to pass to the handler, one dict per
+            job.
+        :type params: dict
+        :returns: The queued jobs.
+        :rtype: list
+        """
+
+        return Job.objects.bulk_create(Job(name=name, params=p) for p in params)
+
+    @staticmethod
+    def claim(limit):
+        """
+        Claim up to `limit` jobs which are due, skipping jobs which
+        another worker is claiming at the same time.
+
+        :param limit: The most jobs to claim.
+        :type limit: int
+        :returns: The claimed jobs.
+        :rtype: list
+        """
+
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(Job.objects.select_for_update(skip_locked=True).filter(is_dead=False, run_after__lte=now).order_by("run_after")[:limit])
+            for job in jobs:
+                job.attempts += 1
+                job.run_after = now + datetime.timedelta(seconds=settings.LTI_JOB_TIMEOUT)
+            Job.objects.bulk_update(jobs, ["attempts", "run_after"])
+
+        return jobs
+
+    def failed(self, error):
+        """
+        Record a failed attempt, scheduling a retry or marking the job
+        dead if it has been attempted too many times.
+
+        :param error: A description of the failure.
+        :type error: string
+        """
+
+        self.last_error = error
+        if self.attempts >= settings.LTI_JOB_MAX_ATTEMPTS:
+            self.is_dead = True
+        else:
+            delay = settings.LTI_JOB_RETRY_DELAY * 2 ** (self.attempts - 1)
+            self.run_after = timezone.now() + datetime.timedelta(seconds=delay)
+        self.save(update_fields=["last_error", "is_dead", "run_after"])
 
 
 class Setting(models.Model):
     """
     This table keeps holds all information necessary to use SDI OS's
-    API.  Only one entry exists in this table, serving as a
-    global API configuration.
+    API.  Each entry is an SDI OS backend which LTI users may be placed
+    on.  The first entry is the default backend, which is configured
+    through the settings page and whose SDIs may be exported.
     """
 
+    name = models.CharField(max_length=100, unique=True, default="default", help_text="A name identifying this SDI OS backend.")
+    is_active = models.BooleanField("Accepts new users", default=True, help_text="Whether new LTI users may be placed on this backend.")
     sdios_url = models.CharField(" URL", max_length=255, help_text="This is where your SDI OS instance lives.", default="127.0.0.1:8000")
     sdios_username = models.CharField("SDI OS API username", max_length=255, help_text="The username of your SDI OS API user.", default="")
     sdios_password = models.CharField("SDI OS API password", max_length=255, help_text="The password of your SDI OS API user.", default="")
     client_id = models.CharField("Client ID", max_length=255, help_text="Client ID found under API application at {SDI OS URL}/api/o/applications.", default="")
     client_secret = models.CharField("Client Secret", max_length=255, help_text="Client Secret found under API application at {SDI OS URL}/api/o/applications.", default="")
+    users_etag = models.CharField(max_length=255, blank=True, default="", editable=False)
+    users_synced = models.DateTimeField(null=True, blank=True, editable=False)
 
     @staticmethod
     def get():
@@ -298,7 +1394,7 @@ class Setting(models.Model):
         """
         try:
             #Default initial settings
-            settings = Setting.objects.all()[0]
+            settings = Setting.objects.order_by("pk")[0]
         except IndexError:
             # Create default settings if all settings are deleted
             settings = Setting()
@@ -306,5 +1402,33 @@ class Setting(models.Model):
 
         return settings
 
+    @staticmethod
+    def place(key):
+        """
+        Choose the backend for a new user.  With the "hash"
+        `LTI_BACKEND_PLACEMENT`, the backend is chosen by rendezvous
+        hashing of `key`, so that adding or removing a backend only
+        moves the users which hash to it.  With "least_loaded", the
+        backend with the fewest users is chosen.  Only backends which
+        accept new users are considered.
+
+        :param key: A string identifying the user.
+        :type key: string
+        :returns: An SDI OS backend.
+        :rtype: :class:`Setting`
+        """
+
+        backends = list(Setting.objects.filter(is_active=True).annotate(users=models.Count("usermap")))
+        if not backends:
+            return Setting.get()
+
+        if settings.LTI_BACKEND_PLACEMENT == "least_loaded":
+            return min(backends, key=lambda backend: (backend.users, backend.pk))
+
+        def score(backend):
+            return hashlib.sha1("{}:{}".format(backend.name, key).encode()).digest()
+
+        return max(backends, key=score)
+
     def __str__(self):
-        return "SDI OS @ {} (ID: {}, Secret: {})".format(self.sdios_url, self.client_id, self.client_secret)
+        return "{}: SDI OS @ {} (ID: {}, Secret: {})".format(self.name, self.sdios_url, self.client_id, self.client_secret)
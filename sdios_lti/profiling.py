@@ -0,0 +1,226 @@
+import asyncio
+import collections
+import datetime
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Characters allowed in profile file names, apart from the separators
+# added here.
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# Profiles are named after their time, process, view and duration.
+_PROFILE_NAME = re.compile(r"^(\d{14})-(\d+)-(.+)-(\d+)ms\.collapsed$")
+
+
+class Sampler:
+    """
+    A single background thread which, while any thread is being
+    profiled, periodically records the call stack of each profiled
+    thread.  The thread sleeps when nothing is being profiled.
+    """
+
+    def __init__(self, interval):
+        self.__interval = interval
+        self.__stacks = {}
+        self.__condition = threading.Condition()
+        self.__thread = None
+
+    def start(self, key, thread_id):
+        """
+        Begin profiling a thread.  The same thread can be profiled under
+        more than one key, as requests served by an event loop share its
+        thread.
+
+        :param key: Identifies the profile to :meth:`stop`.
+        :type key: object
+        :param thread_id: The thread's identifier.
+        :type thread_id: int
+        """
+
+        with self.__condition:
+            self.__stacks[key] = (thread_id, collections.Counter())
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="profiler", daemon=True)
+                self.__thread.start()
+            self.__condition.notify()
+
+    def stop(self, key):
+        """
+        Stop profiling a thread, returning how many times each stack was
+        seen.
+
+        :param key: The key the profile was started with.
+        :type key: object
+        :returns: Counts of each stack, as a tuple of frames from the
+            outermost call inwards.
+        :rtype: :class:`collections.Counter`
+        """
+
+        with self.__condition:
+            return self.__stacks.pop(key)[1]
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__stacks:
+                    self.__condition.wait()
+                profiles = [(key, thread_id) for key, (thread_id, _) in self.__stacks.items()]
+
+            frames = sys._current_frames()
+            stacks = {thread_id: Sampler.__stack(frames[thread_id]) for thread_id in set(thread_id for _, thread_id in profiles) if thread_id in frames}
+            del frames
+
+            with self.__condition:
+                for key, thread_id in profiles:
+                    if key in self.__stacks and thread_id in stacks:
+                        self.__stacks[key][1][stacks[thread_id]] += 1
+
+            time.sleep(self.__interval)
+
+    @staticmethod
+    def __stack(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+            frame = frame.f_back
+
+        return tuple(reversed(stack))
+
+
+class ProfilingMiddleware:
+    """
+    Profile a fraction of requests (`LTI_PROFILE_SAMPLE_RATE`) and/or
+    requests slower than `LTI_PROFILE_SLOW_MS`, writing their sampled
+    call stacks to `LTI_PROFILE_DIR` in the collapsed format read by
+    flamegraph.pl and speedscope.  Only the newest
+    `LTI_PROFILE_MAX_FILES` profiles are kept.
+
+    Under ASGI, the event loop's thread is sampled, so a profile also
+    holds the work of other requests served meanwhile.  If neither
+    setting is enabled, the middleware removes itself and costs nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.LTI_PROFILE_SAMPLE_RATE and settings.LTI_PROFILE_SLOW_MS is None:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the middleware as a coroutine function, as Django's
+            # own middleware do, so that it is awaited under ASGI.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+        self.__sampler = Sampler(settings.LTI_PROFILE_INTERVAL_MS / 1000)
+        os.makedirs(settings.LTI_PROFILE_DIR, exist_ok=True)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        profile = self.__start()
+        try:
+            return self.get_response(request)
+        finally:
+            self.__finish(request, profile)
+
+    async def __acall__(self, request):
+        profile = self.__start()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.__finish(request, profile)
+
+    def __start(self):
+        sampled = random.random() < settings.LTI_PROFILE_SAMPLE_RATE
+        if not sampled and settings.LTI_PROFILE_SLOW_MS is None:
+            return None
+
+        # Every request must be sampled to catch the slow ones, but
+        # only profiles of requests which turn out slow are kept.
+        key = object()
+        self.__sampler.start(key, threading.get_ident())
+        return key, sampled, time.monotonic()
+
+    def __finish(self, request, profile):
+        if profile is None:
+            return
+
+        key, sampled, start = profile
+        stacks = self.__sampler.stop(key)
+        elapsed_ms = (time.monotonic() - start) * 1000
+        slow = settings.LTI_PROFILE_SLOW_MS is not None and elapsed_ms >= settings.LTI_PROFILE_SLOW_MS
+        if (sampled or slow) and stacks:
+            try:
+                self.__write(request, elapsed_ms, stacks)
+            except OSError as err:
+                print("Unable to write profile: {}".format(err))
+
+    def __write(self, request, elapsed_ms, stacks):
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match and match.url_name else request.path
+        name = "{}-{}-{}-{:.0f}ms.collapsed".format(time.strftime("%Y%m%d%H%M%S"), os.getpid(), _UNSAFE.sub("_", view).strip("_") or "root", elapsed_ms)
+
+        with open(os.path.join(settings.LTI_PROFILE_DIR, name), "w") as f:
+            for stack, count in stacks.most_common():
+                f.write("{} {}\n".format(";".join(stack), count))
+
+        prune(settings.LTI_PROFILE_MAX_FILES)
+
+
+def list_profiles():
+    """
+    Return the saved profiles, newest first.
+
+    :returns: Dicts with each profile's file name, time, view, duration
+        and size.
+    :rtype: list
+    """
+
+    profiles = []
+    try:
+        names = os.listdir(settings.LTI_PROFILE_DIR)
+    except FileNotFoundError:
+        return profiles
+
+    for name in names:
+        match = _PROFILE_NAME.match(name)
+        if match is None:
+            continue
+        stamp, pid, view, ms = match.groups()
+        profiles.append({
+            "name": name,
+            "time": datetime.datetime.strptime(stamp, "%Y%m%d%H%M%S"),
+            "pid": int(pid),
+            "view": view,
+            "ms": int(ms),
+            "size": os.path.getsize(os.path.join(settings.LTI_PROFILE_DIR, name)),
+        })
+
+    return sorted(profiles, key=lambda p: p["name"], reverse=True)
+
+
+def prune(keep):
+    """
+    Delete all but the newest `keep` profiles.
+
+    :param keep: The number of profiles to keep.
+    :type keep: int
+    """
+
+    names = sorted(name for name in os.listdir(settings.LTI_PROFILE_DIR) if name.endswith(".collapsed"))
+    for name in names[:-keep] if keep else names:
+        try:
+            os.remove(os.path.join(settings.LTI_PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Models whose reads must always see the latest writes: launch admission
+# counts tickets in progress, job workers claim jobs, and a session
+# must be found on the request after logging in.
+PRIMARY_ONLY = {"sdios_lti.launchticket", "sdios_lti.job", "sessions.session"}
+
+# Replication lag is measured as the time since the last replayed
+# transaction, unless the replica has replayed everything it received.
+LAG_QUERY = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# The routing state of the request being served, set by
+# ReplicaPinningMiddleware.  Outside requests there is none, and every
+# query goes to the primary.
+_request = contextvars.ContextVar("sdios_lti_replica_request", default=None)
+
+# The last measured lag of each replica, as (time checked, lag).
+_lags = {}
+_lags_lock = threading.Lock()
+
+
+def _lag(alias):
+    with _lags_lock:
+        checked, lag = _lags.get(alias, (None, None))
+        if checked is not None and time.monotonic() - checked < settings.LTI_REPLICA_LAG_CHECK_INTERVAL:
+            return lag
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_QUERY)
+            lag = float(cursor.fetchone()[0] or 0)
+    except Exception as err:
+        print("Unable to check lag of database {}: {}".format(alias, err))
+        lag = float("inf")
+
+    with _lags_lock:
+        _lags[alias] = (time.monotonic(), lag)
+
+    return lag
+
+
+def _replicas():
+    """
+    Return the replicas which are close enough behind the primary to
+    read from.
+    """
+
+    if settings.LTI_REPLICA_MAX_LAG is None:
+        return list(settings.LTI_DATABASE_REPLICAS)
+
+    return [alias for alias in settings.LTI_DATABASE_REPLICAS if _lag(alias) <= settings.LTI_REPLICA_MAX_LAG]
+
+
+class ReplicaRouter:
+    """
+    Send reads made while serving a request to one of the databases in
+    `LTI_DATABASE_REPLICAS`, and everything else to the primary
+    ("default") database.
+
+    Once a request writes to the database, its later reads also go to
+    the primary, so that it sees its own writes.  Replicas more than
+    `LTI_REPLICA_MAX_LAG` seconds behind the primary are not read from.
+    Reads of launch tickets, jobs and sessions always go to the
+    primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        if state is None or state["pinned"] or model._meta.label_lower in PRIMARY_ONLY:
+            return DEFAULT_DB_ALIAS
+
+        if "replica" not in state:
+            replicas = _replicas()
+            state["replica"] = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+        return state["replica"]
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None and model._meta.label_lower not in PRIMARY_ONLY:
+            state["pinned"] = True
+
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinningMiddleware:
+    """
+    Give each request its own routing state for :class:`ReplicaRouter`,
+    so that reads are only sent to a replica within a request, and a
+    request's writes only pin that request to the primary.  Without
+    replicas, the middleware removes itself and costs nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.LTI_DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the middleware as a coroutine function, as Django's
+            # own middleware do, so that it is awaited under ASGI.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        # The state is a dict rather than separate values so that writes
+        # made in sync_to_async() worker threads, which run in a copy of
+        # the context, still pin the request.
+        token = _request.set({"pinned": False})
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set({"pinned": False})
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
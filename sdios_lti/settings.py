@@ -65,6 +65,9 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE = (
+    "sdios_lti.profiling.ProfilingMiddleware",
+    "sdios_lti.memory.MemoryProfilingMiddleware",
+    "sdios_lti.routers.ReplicaPinningMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -77,6 +80,10 @@ ROOT_URLCONF = "sdios_lti.urls"
 
 WSGI_APPLICATION = "sdios_lti.wsgi.application"
 
+# Serve LTI launches with an async view.  This is set by asgi.py, and
+# should not be used under WSGI.
+LTI_ASYNC_LAUNCH = os.environ.get("SDIOS_LTI_ASGI") == "1"
+
 # Database
 # https://docs.djangoproject.com/en/1.7/ref/settings/#databases
 
@@ -88,15 +95,41 @@ DATABASES = {
         "PASSWORD": "sdios_lti",
         "HOST": "localhost",
         "PORT": "",
+        # Keep connections open between requests, so that the connection
+        # opened by warm-up is still open for the first launch.
+        "CONN_MAX_AGE": 60,
     }
 }
 
+# Read replicas
+# Reads made while serving a request go to one of these DATABASES
+# aliases, e.g. ["replica"], unless the request has written to the
+# database.  Replicas more than LTI_REPLICA_MAX_LAG seconds behind the
+# primary are skipped (None to never check), with lag checked at most
+# every LTI_REPLICA_LAG_CHECK_INTERVAL seconds.
+
+DATABASE_ROUTERS = ["sdios_lti.routers.ReplicaRouter"]
+
+LTI_DATABASE_REPLICAS = []
+
+LTI_REPLICA_MAX_LAG = 5
+
+LTI_REPLICA_LAG_CHECK_INTERVAL = 5
+
 STATIC_ROOT = '/var/www/html/lti-app/sdios_lti/STATIC'
 
 # URL prefix for static files.
 # Example: "http://example.com/static/", "http://static.example.com/"
 STATIC_URL = "/static/"
 
+# Static files are collected with content-hashed names and precompressed
+# variants; see the build_assets command.
+STATICFILES_STORAGE = "sdios_lti.storage.CompressedManifestStaticFilesStorage"
+
+# Include the bundles built by build_assets rather than individual
+# static files.
+LTI_BUNDLE_ASSETS = not DEBUG
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.7/topics/i18n/
 
@@ -109,3 +142,173 @@ USE_I18N = True
 USE_L10N = True
 
 USE_TZ = True
+
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+
+# LTI environment reaping
+# User copies of LTI environments are stopped and deleted by the
+# reap_environments command once they have been idle for this many
+# minutes.  Each exported SDI may override these; None means never.
+
+LTI_IDLE_STOP_MINUTES = None
+
+LTI_IDLE_DELETE_MINUTES = None
+
+# LTI launch admission
+# At most this many launches may be in progress at once; further
+# launches wait their turn in a queue.  Consumers and exported SDIs may
+# set their own, lower limits.  None means no limit.
+
+LTI_MAX_CONCURRENT_LAUNCHES = None
+
+# Seconds a launch may wait in the queue before it is turned away.
+
+LTI_LAUNCH_QUEUE_TIMEOUT = 60
+
+# Seconds after which an unfinished launch is assumed to have been
+# abandoned and no longer counts against the limits.
+
+LTI_LAUNCH_TICKET_EXPIRY = 600
+
+# SDI OS backends
+# New LTI users are placed on one of the active SDI OS backends, either
+# by hashing their user ID ("hash") or on the backend with the fewest
+# users ("least_loaded").
+
+LTI_BACKEND_PLACEMENT = "hash"
+
+# Number of connections kept open to each SDI OS backend.
+
+LTI_SDIOS_POOL_SIZE = 10
+
+# SDI OS user mirror
+# Users in the local mirror of SDI OS users are trusted for this many
+# seconds after being verified, after which they are checked against
+# SDI OS again.  Run the sync_sdios_users command more often than this
+# to keep launches from having to check.
+
+LTI_USER_MIRROR_MAX_AGE = 300
+
+# Launch records
+# Records of each launch are written to the database in batches of this
+# many, or this many seconds after the first unwritten launch.
+
+LTI_LAUNCH_RECORD_BATCH = 100
+
+LTI_LAUNCH_RECORD_FLUSH_INTERVAL = 5
+
+# Cache
+# Shared by the worker processes on this host through files, so that
+# they serve the same SDI inventory snapshot.  When running on more
+# than one host, use a cache server they all share, such as Memcached.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache"),
+    }
+}
+
+# SDI inventory
+# The SDIs page is served from a snapshot of the SDI list which is
+# rebuilt at most every LTI_INVENTORY_MAX_AGE seconds and kept in the
+# cache.  Open pages poll for changes this often.  Changes are kept for
+# LTI_INVENTORY_HISTORY snapshots; pages which fall further behind
+# reload every SDI.
+
+LTI_INVENTORY_MAX_AGE = 10
+
+LTI_INVENTORY_HISTORY = 100
+
+# Course contexts
+# An environment becomes active in a course when it is launched from
+# the course for the first time, or for the first time in this many
+# minutes.  Up to LTI_CONTEXT_PREPARE_LIMIT learners seen in the course
+# before are then given copies in the background.  A learner's launch
+# waits up to LTI_CONTEXT_PREPARE_WAIT seconds for a copy still being
+# prepared for them, after which the preparation is assumed abandoned.
+
+LTI_CONTEXT_SESSION_GAP_MINUTES = 120
+
+LTI_CONTEXT_PREPARE_LIMIT = 200
+
+LTI_CONTEXT_PREPARE_WAIT = 60
+
+# Background jobs
+# Jobs queued by launches are run by the run_jobs command.  A job which
+# fails is retried after LTI_JOB_RETRY_DELAY seconds, doubling with each
+# attempt, until it has been attempted LTI_JOB_MAX_ATTEMPTS times.  A job
+# still running after LTI_JOB_TIMEOUT seconds is assumed to have been
+# abandoned and is run again.
+
+LTI_JOB_MAX_ATTEMPTS = 5
+
+LTI_JOB_RETRY_DELAY = 30
+
+LTI_JOB_TIMEOUT = 300
+
+# SDI OS API calls
+# Calls to SDI OS taking at least LTI_API_SLOW_MS milliseconds, and
+# failed calls, are kept in memory by each worker, up to
+# LTI_API_CALL_BUFFER calls, and shown on the SDI OS Calls page.
+
+LTI_API_SLOW_MS = 1000
+
+LTI_API_CALL_BUFFER = 500
+
+# Worker statistics
+# Workers write statistics they keep in memory, such as slow SDI OS
+# calls, to files in LTI_WORKER_STATS_DIR at most every
+# LTI_WORKER_STATS_INTERVAL seconds, so that any worker can show them
+# for all workers.
+
+LTI_WORKER_STATS_DIR = os.path.join(BASE_DIR, "worker_stats")
+
+LTI_WORKER_STATS_INTERVAL = 10
+
+# Request profiling
+# Profile this fraction of requests (0 to 1), and/or every request which
+# takes at least LTI_PROFILE_SLOW_MS milliseconds (None to disable).
+# Profiles sample each request's call stack every LTI_PROFILE_INTERVAL_MS
+# milliseconds, and the newest LTI_PROFILE_MAX_FILES are kept in
+# LTI_PROFILE_DIR.  Profiling costs nothing while both are disabled.
+
+LTI_PROFILE_SAMPLE_RATE = 0
+
+LTI_PROFILE_SLOW_MS = None
+
+LTI_PROFILE_INTERVAL_MS = 5
+
+LTI_PROFILE_MAX_FILES = 200
+
+LTI_PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+
+# Memory profiling
+# Trace the memory allocated by this fraction of requests (0 to 1),
+# recording a histogram of peak memory per view and the lines which
+# allocated the most.  Requests whose peak exceeds their view's budget
+# in LTI_MEMORY_BUDGETS (by URL name, e.g. {"sdis": 65536}), or
+# LTI_MEMORY_BUDGET_KB (None for no budget), are logged.  Tracing costs
+# nothing while the sample rate is 0.
+
+LTI_MEMORY_SAMPLE_RATE = 0
+
+LTI_MEMORY_BUDGET_KB = None
+
+LTI_MEMORY_BUDGETS = {}
+
+# Stack frames kept for each traced allocation, allocation sites
+# reported, and milliseconds between checks for a new peak.
+
+LTI_MEMORY_TRACE_FRAMES = 1
+
+LTI_MEMORY_TOP_SITES = 10
+
+LTI_MEMORY_SNAPSHOT_INTERVAL_MS = 50
+
+# Worker warm-up
+# Warm up each worker process in the background as it starts (under
+# uWSGI) or on its first request, rather than on its first launch.
+# /ready/ reports not ready until warm-up has finished.
+
+LTI_WARMUP = False
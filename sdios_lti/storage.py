@@ -0,0 +1,41 @@
+import gzip
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Static files storage which, in addition to giving files
+    content-hashed names and writing a manifest of them, writes gzip and
+    brotli compressed variants of each hashed file.  A webserver can
+    then serve the precompressed variants directly (e.g. Nginx's
+    `gzip_static` and `brotli_static`).
+    """
+
+    COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".eot", ".ttf", ".json")
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        for name in set(self.hashed_files.values()):
+            if name.endswith(self.COMPRESSIBLE_EXTENSIONS):
+                self.__compress(name)
+
+    def __compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+
+        variants = (
+            (".gz", gzip.compress(content, compresslevel=9, mtime=0)),
+            (".br", brotli.compress(content, quality=11)),
+        )
+
+        # Only keep variants which are actually smaller.
+        for extension, compressed in variants:
+            if len(compressed) < len(content):
+                with open(self.path(name) + extension, "wb") as f:
+                    f.write(compressed)
@@ -0,0 +1,233 @@
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubSDIOS:
+    """
+    A minimal, in-memory stand-in for the parts of the SDI OS API used
+    by this application, for replaying launches and benchmarking without
+    a real SDI OS instance.  Any credentials are accepted.  Every call
+    takes `latency` seconds, to approximate a real instance.
+
+    Point a backend at it by setting its URL to the stub's
+    :attr:`url` (including the ``http://`` prefix).
+
+    :param latency: Seconds each API call takes.
+    :type latency: float
+    """
+
+    ADMIN_PK = 1
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.url = None
+        self.calls = 0
+        self.__lock = threading.Lock()
+        self.__pks = itertools.count(self.ADMIN_PK)
+        self.__users_version = 0
+        self.users = {}
+        self.sdis = {}
+        self.add_user("admin")
+
+    def add_user(self, username, **fields):
+        """
+        Add a user, returning its representation.
+
+        :param username: The username.
+        :type username: string
+        :rtype: dict
+        """
+
+        with self.__lock:
+            pk = next(self.__pks)
+            user = dict(fields, pk=pk, username=username, tenancy=fields.get("tenancy", 1), is_active=fields.get("is_active", True))
+            self.users[pk] = user
+            self.__users_version += 1
+            return user
+
+    def add_sdi(self, name, user=ADMIN_PK, sdi_id=None):
+        """
+        Add an SDI, returning its representation.
+
+        :param name: The SDI name.
+        :type name: string
+        :param user: The pk of the owning user.
+        :type user: int
+        :param sdi_id: The SDI's UUID, or `None` to generate one.
+        :type sdi_id: string or `None`
+        :rtype: dict
+        """
+
+        with self.__lock:
+            sdi_id = sdi_id or str(uuid.uuid4())
+            sdi = {
+                "sdi_id": sdi_id,
+                "name": name,
+                "user": user,
+                "state": "stopped",
+                "url": "{}/sdis/{}/".format(self.url or "", sdi_id),
+                "modified": time.time(),
+            }
+            self.sdis[sdi_id] = sdi
+            return sdi
+
+    def start(self, host="127.0.0.1", port=0):
+        """
+        Serve the API in a background thread.
+
+        :param host: The address to listen on.
+        :type host: string
+        :param port: The port to listen on, or 0 for any free port.
+        :type port: int
+        :returns: The server, which can be stopped with `shutdown()`.
+        :rtype: :class:`http.server.ThreadingHTTPServer`
+        """
+
+        server = self.server(host, port)
+        threading.Thread(target=server.serve_forever, name="stub-sdios", daemon=True).start()
+        return server
+
+    def server(self, host="127.0.0.1", port=0):
+        """
+        Return a server for the API, without starting it.
+        """
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.handle(self, "GET")
+
+            def do_POST(self):
+                stub.handle(self, "POST")
+
+            def do_PUT(self):
+                stub.handle(self, "PUT")
+
+            def do_DELETE(self):
+                stub.handle(self, "DELETE")
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        self.url = "http://{}:{}".format(*server.server_address[:2])
+        for sdi in self.sdis.values():
+            sdi["url"] = "{}/sdis/{}/".format(self.url, sdi["sdi_id"])
+
+        return server
+
+    def handle(self, request, method):
+        length = int(request.headers.get("Content-Length") or 0)
+        body = request.rfile.read(length) if length else b""
+        path = re.sub(r"/+", "/", request.path.split("?")[0]).strip("/")
+        if path.startswith("api/"):
+            path = path[len("api/"):]
+
+        time.sleep(self.latency)
+        with self.__lock:
+            self.calls += 1
+
+        for pattern, route_method, fn in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+            if match and route_method == method:
+                try:
+                    data = json.loads(body) if body and body.startswith((b"{", b"[")) else {}
+                    status, result = fn(self, request, data, *match.groups())
+                except KeyError:
+                    status, result = 404, {"detail": "not found"}
+                break
+        else:
+            status, result = 404, {"detail": "not found"}
+
+        payload = b"" if result is None else json.dumps(result).encode()
+        request.send_response(status)
+        if isinstance(result, list) and path == "accounts/users":
+            request.send_header("ETag", '"users-{}"'.format(self.__users_version))
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def __token(self, request, data):
+        return 200, {"token_type": "Bearer", "access_token": uuid.uuid4().hex, "expires_in": 36000}
+
+    def __settings(self, request, data):
+        return 200, {"default_tenancy": 1}
+
+    def __list_users(self, request, data):
+        with self.__lock:
+            if request.headers.get("If-None-Match") == '"users-{}"'.format(self.__users_version):
+                return 304, None
+            return 200, list(self.users.values())
+
+    def __create_user(self, request, data):
+        if any(user["username"] == data["username"] for user in list(self.users.values())):
+            return 400, {"username": ["already exists"]}
+        return 201, self.add_user(data["username"], tenancy=data.get("tenancy", 1))
+
+    def __get_user(self, request, data, pk):
+        return 200, self.users[int(pk)]
+
+    def __update_user(self, request, data, pk):
+        with self.__lock:
+            self.users[int(pk)].update(tenancy=data.get("tenancy", 1), is_active=data.get("is_active", True))
+            self.__users_version += 1
+            return 200, self.users[int(pk)]
+
+    def __delete_user(self, request, data, pk):
+        with self.__lock:
+            del self.users[int(pk)]
+            self.__users_version += 1
+        return 204, None
+
+    def __list_sdis(self, request, data):
+        return 200, list(self.sdis.values())
+
+    def __copy_sdi(self, request, data, sdi_id):
+        if sdi_id not in self.sdis:
+            return 404, {"detail": "not found"}
+        if any(sdi["name"] == data["name"] and sdi["user"] == data["user"] for sdi in list(self.sdis.values())):
+            return 400, {"name": ["already exists"]}
+        return 201, self.add_sdi(data["name"], user=data["user"])
+
+    def __start_sdi(self, request, data, sdi_id):
+        self.sdis[sdi_id]["state"] = "running"
+        return 200, None
+
+    def __stop_sdi(self, request, data, sdi_id):
+        self.sdis[sdi_id]["state"] = "stopped"
+        return 200, None
+
+    def __delete_sdi(self, request, data, sdi_id):
+        if self.sdis[sdi_id]["state"] == "running":
+            return 400, {"detail": "SDI is running"}
+        del self.sdis[sdi_id]
+        return 204, None
+
+    def __login_token(self, request, data):
+        return 200, {"url": "{}/accounts/login/token/{}/".format(self.url, uuid.uuid4().hex)}
+
+    ROUTES = (
+        (r"o/token", "POST", __token),
+        (r"system/settings", "GET", __settings),
+        (r"accounts/users", "GET", __list_users),
+        (r"accounts/users", "POST", __create_user),
+        (r"accounts/users/(\d+)", "GET", __get_user),
+        (r"accounts/users/(\d+)", "PUT", __update_user),
+        (r"accounts/users/(\d+)", "DELETE", __delete_user),
+        (r"accounts/login/token", "POST", __login_token),
+        (r"sdis", "GET", __list_sdis),
+        (r"sdis/([^/]+)/copy", "POST", __copy_sdi),
+        (r"sdis/([^/]+)/start", "POST", __start_sdi),
+        (r"sdis/([^/]+)/stop", "POST", __stop_sdi),
+        (r"sdis/([^/]+)", "DELETE", __delete_sdi),
+    )
@@ -0,0 +1,29 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from sdios_lti.assets import BUNDLES
+
+
+register = template.Library()
+
+TAGS = {
+    "css": '<link rel="stylesheet" href="{}" />',
+    "js": '<script src="{}"></script>',
+}
+
+
+@register.simple_tag
+def bundle(kind):
+    """
+    Include the static files of the specified bundle, either "css" or
+    "js".  When `LTI_BUNDLE_ASSETS` is set, the built bundle is
+    included; otherwise each file is included separately.
+    """
+
+    path, sources = BUNDLES[kind]
+    if settings.LTI_BUNDLE_ASSETS:
+        return format_html(TAGS[kind], static(path))
+
+    return format_html_join("\n", TAGS[kind], ((static(source),) for source in sources))
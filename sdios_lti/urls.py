@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.conf.urls import include, url
 from django.contrib import admin
 
@@ -10,6 +11,7 @@ urlpatterns = [
     url(r"^logout/$", sdios_lti.views.logout, name="logout"),
 
     url(r"^sdis/$", sdios_lti.views.view_environments, name="sdis"),
+    url(r"^sdis/changes/$", sdios_lti.views.environment_changes, name="environment_changes"),
     url(r"^sdis/export/$", sdios_lti.views.export_environment, name="export_environment"),
     url(r"^sdis/remove/(?P<sdi_id>[0-9a-f]{8}-([0-9a-f]{4}-){3}[0-9a-f]{12})/$", sdios_lti.views.remove_lti_access, name="remove_lti_access"),
 
@@ -19,9 +21,20 @@ urlpatterns = [
 
     url(r"^users/$", sdios_lti.views.view_users, name="users"),
 
+    url(r"^launches/$", sdios_lti.views.view_launches, name="launches"),
+
+    url(r"^api-calls/$", sdios_lti.views.view_api_calls, name="api_calls"),
+
+    url(r"^memory/$", sdios_lti.views.view_memory, name="memory"),
+
+    url(r"^profiles/$", sdios_lti.views.view_profiles, name="profiles"),
+    url(r"^profiles/(?P<name>[^/]+\.collapsed)$", sdios_lti.views.download_profile, name="download_profile"),
+
     url(r"^settings/$", sdios_lti.views.manage_settings, name="settings"),
 
-    url(r"^lti/$", sdios_lti.views.lti, name="lti"),
+    url(r"^ready/$", sdios_lti.views.ready, name="ready"),
+
+    url(r"^lti/$", sdios_lti.views.lti_async if settings.LTI_ASYNC_LAUNCH else sdios_lti.views.lti, name="lti"),
 
     url(r"^admin/", admin.site.urls, name="admin"),
 ]
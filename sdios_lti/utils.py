@@ -55,16 +55,59 @@ def validate_signature(post, meta, post_body, uri_path):
     except Consumer.DoesNotExist:
         raise UnauthorizedRequest("invalid consumer key")
 
+    oauth_signature = base64.b64decode(urllib.parse.unquote(post["oauth_signature"]))
+
+    if oauth_signature != __sign(consumer_secret, signature_base_string):
+        raise UnauthorizedRequest("Signature validation failed")
+
+
+def sign_launch(params, url, consumer_secret):
+    """
+    Sign an LTI launch as an LMS would, returning a POST body which
+    :func:`validate_signature` accepts.  This is used to replay recorded
+    launches.
+
+    :param params: The launch parameters, including the OAuth
+        parameters apart from "oauth_signature".
+    :type params: dict
+    :param url: The URL the launch will be posted to, e.g.
+        ``"http://localhost:8000/lti/"``.
+    :type url: string
+    :param consumer_secret: The consumer's secret.
+    :type consumer_secret: string
+    :returns: The body of the POST request.
+    :rtype: bytes
+    """
+
+    post_body = "&".join("{}={}".format(urllib.parse.quote(key, ""), urllib.parse.quote(value, "")) for key, value in sorted(params.items())).encode()
+
+    # OAuth 1.0 §9.1.3.
+    parts = [b"POST", url.encode(), __normalize_request_parameters(post_body, b"")]
+    signature_base_string = '&'.join(urllib.parse.quote_from_bytes(part, b"") for part in parts)
+
+    signature = base64.b64encode(__sign(consumer_secret, signature_base_string)).decode()
+
+    return post_body + "&oauth_signature={}".format(urllib.parse.quote(signature, "")).encode()
+
+
+def __sign(consumer_secret, signature_base_string):
+    """
+    Return the HMAC-SHA1 signature of a signature base string.
+
+    :param consumer_secret: The consumer's secret.
+    :type consumer_secret: string
+    :param signature_base_string: The string to sign.
+    :type signature_base_string: string
+    :returns: The raw signature.
+    :rtype: bytes
+    """
+
     # Consumer secret must be concatenated with "&" and the token
     # secret, even if that is empty (OAuth 1.0 §9.2).
     secret = urllib.parse.quote(consumer_secret, "") + "&"
 
     # OAuth 1.0 §9.2.2.
-    hmac = HMAC.new(secret.encode(), msg=signature_base_string.encode(), digestmod=SHA)
-    oauth_signature = base64.b64decode(urllib.parse.unquote(post["oauth_signature"]))
-
-    if oauth_signature != hmac.digest():
-        raise UnauthorizedRequest("Signature validation failed")
+    return HMAC.new(secret.encode(), msg=signature_base_string.encode(), digestmod=SHA).digest()
 
 
 def __validate_keys(post):
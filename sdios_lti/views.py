@@ -1,20 +1,46 @@
+import datetime
 import functools
+import os
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDay, TruncHour
 from django.urls import reverse
-from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, redirect
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
+import sdios_lti.inventory
 import sdios_lti.utils
-from sdios_lti.api import APIRequest
+from sdios_lti.admission import admit, AsyncAdmission, QueueTimeout
+from sdios_lti.analytics import LaunchRecorder, Percentile
+from sdios_lti.apicalls import recent_calls, summarize
+from sdios_lti.api import APIRequest, AsyncAPIRequest
 from sdios_lti.decorators import ajax_required
 from sdios_lti.forms import CreateConsumerForm, ManageSettingsForm, ExportEnvironmentForm
-from sdios_lti.models import EnvironmentMap, UserMap, Consumer, Setting
+from sdios_lti.memory import collect as collect_memory
+from sdios_lti.models import CourseContext, EnvironmentMap, LaunchRecord, UserMap, Consumer, Setting
+from sdios_lti.profiling import list_profiles
+from sdios_lti.warmup import is_ready
 
 
 HTTP_UNAUTHORIZED = 401
+HTTP_SERVICE_UNAVAILABLE = 503
+
+# Time windows offered by the SDI OS calls page, in minutes.
+API_CALL_WINDOWS = (15, 60, 240, 1440)
+
+# Time windows offered by the launch report, and the interval launches
+# are grouped by within each.
+LAUNCH_REPORT_WINDOWS = {
+    "day": (datetime.timedelta(days=1), TruncHour),
+    "week": (datetime.timedelta(days=7), TruncDay),
+    "month": (datetime.timedelta(days=30), TruncDay),
+}
 
 
 # This is exempt from cross-site request forgery protection, because the
@@ -25,11 +51,20 @@ def lti(request):
     Process an LTI request.  This must be an HTTP POST from an
     LTI-compatible LMS.
     """
+    recorder = LaunchRecorder()
+    response = _lti(request, recorder)
+    recorder.finish(response)
+
+    return response
+
+
+def _lti(request, recorder):
     if request.method != "POST":
         return HttpResponseBadRequest("POST data only")
 
     try:
-        sdios_lti.utils.validate_signature(request.POST, request.META, request.body, reverse("lti"))
+        with recorder.phase("validate"):
+            sdios_lti.utils.validate_signature(request.POST, request.META, request.body, reverse("lti"))
     except sdios_lti.utils.BadRequest as err:
         return HttpResponseBadRequest(f"{err}")
     except sdios_lti.utils.UnauthorizedRequest as err:
@@ -43,25 +78,149 @@ def lti(request):
         return HttpResponseBadRequest("missing parameters")
 
     try:
-        api = APIRequest()
-    except Exception:
-        return HttpResponseBadRequest("unable to connect to SDI OS")
+        environment = recorder.record.environment = EnvironmentMap.objects.get(lti_environment_key=environment_key)
+        consumer = recorder.record.consumer = Consumer.get_consumer(consumer_key)
+    except (EnvironmentMap.DoesNotExist, Consumer.DoesNotExist):
+        return HttpResponseBadRequest("cannot look up information")
 
+    # Wait for a place among the launches in progress before doing any
+    # work against SDI OS.
     try:
-        environment = EnvironmentMap.objects.get(lti_environment_key=environment_key)
-        usermap = UserMap.get(api, consumer_key, user_id)
-    except (Exception, KeyError, EnvironmentMap.DoesNotExist, UserMap.DoesNotExist):
-        return HttpResponseBadRequest("cannot look up information")
+        with admit(consumer, environment) as ticket:
+            recorder.record.queue_ms = ticket.wait_ms()
+
+            try:
+                with recorder.phase("connect"):
+                    api = APIRequest(backend=UserMap.get_backend(consumer_key, user_id))
+            except Exception:
+                return HttpResponseBadRequest("unable to connect to SDI OS")
+
+            try:
+                with recorder.phase("user"):
+                    usermap = recorder.record.usermap = UserMap.get(api, consumer_key, user_id)
+            except (Exception, KeyError, EnvironmentMap.DoesNotExist, UserMap.DoesNotExist):
+                return HttpResponseBadRequest("cannot look up information")
+
+            _record_context(request.POST, consumer, environment, usermap)
+
+            try:
+                with recorder.phase("login"):
+                    url = sdios_lti.models.UserMap.login(api, usermap, environment)
+            except Exception:
+                return HttpResponseBadRequest("cannot log in")
+    except QueueTimeout:
+        return _queue_full()
+
+    return HttpResponseRedirect(url)
+
+
+# Served in place of lti() when deployed through asgi.py, so that a
+# launch waiting on SDI OS does not hold a worker thread.
+@csrf_exempt
+async def lti_async(request):
+    """
+    Asynchronous version of :func:`lti`.  Database access is run in a
+    worker thread, and SDI OS calls are made without blocking.
+    """
+    recorder = LaunchRecorder()
+    response = await _lti_async(request, recorder)
+    recorder.finish(response)
+
+    return response
+
+
+async def _lti_async(request, recorder):
+    if request.method != "POST":
+        return HttpResponseBadRequest("POST data only")
+
+    try:
+        with recorder.phase("validate"):
+            await sync_to_async(sdios_lti.utils.validate_signature)(request.POST, request.META, request.body, reverse("lti"))
+    except sdios_lti.utils.BadRequest as err:
+        return HttpResponseBadRequest(f"{err}")
+    except sdios_lti.utils.UnauthorizedRequest as err:
+        return HttpResponse(f"{err}", status=HTTP_UNAUTHORIZED)
+
+    try:
+        environment_key = request.POST["custom_sdi"]
+        consumer_key = request.POST["oauth_consumer_key"]
+        user_id = request.POST["user_id"]
+    except KeyError:
+        return HttpResponseBadRequest("missing parameters")
 
     try:
-        url = sdios_lti.models.UserMap.login(api, usermap, environment)
-    except Exception:
-        return HttpResponseBadRequest("cannot log in")
+        environment = recorder.record.environment = await sync_to_async(EnvironmentMap.objects.get)(lti_environment_key=environment_key)
+        consumer = recorder.record.consumer = await sync_to_async(Consumer.get_consumer)(consumer_key)
+    except (EnvironmentMap.DoesNotExist, Consumer.DoesNotExist):
+        return HttpResponseBadRequest("cannot look up information")
 
+    try:
+        async with AsyncAdmission(consumer, environment) as ticket:
+            recorder.record.queue_ms = ticket.wait_ms()
+
+            try:
+                with recorder.phase("connect"):
+                    backend = await sync_to_async(UserMap.get_backend)(consumer_key, user_id)
+                    api = await AsyncAPIRequest.connect(backend=backend)
+            except Exception:
+                return HttpResponseBadRequest("unable to connect to SDI OS")
+
+            try:
+                with recorder.phase("user"):
+                    usermap = recorder.record.usermap = await UserMap.get_async(api, consumer_key, user_id)
+            except (Exception, KeyError, EnvironmentMap.DoesNotExist, UserMap.DoesNotExist):
+                return HttpResponseBadRequest("cannot look up information")
+
+            await sync_to_async(_record_context)(request.POST, consumer, environment, usermap)
+
+            try:
+                with recorder.phase("login"):
+                    url = await UserMap.login_async(api, usermap, environment)
+            except Exception:
+                return HttpResponseBadRequest("cannot log in")
+    except QueueTimeout:
+        return _queue_full()
 
     return HttpResponseRedirect(url)
 
 
+def _record_context(post, consumer, environment, usermap):
+    """
+    Record the course a launch came from, if the LMS passed one.  This
+    only helps later launches, so a failure does not fail the launch.
+    """
+
+    if not post.get("context_id"):
+        return
+
+    # Users launching without roles are assumed to be learners.
+    roles = post.get("roles", "")
+    is_learner = not roles or "learner" in roles.lower()
+
+    try:
+        CourseContext.record_launch(consumer, environment, usermap, post["context_id"], post.get("context_title", "")[:255], is_learner)
+    except Exception as err:
+        print("Unable to record course context: {}".format(err))
+
+
+def _queue_full():
+    response = HttpResponse("too many launches in progress, please try again", status=HTTP_SERVICE_UNAVAILABLE)
+    response["Retry-After"] = "30"
+    return response
+
+
+def ready(request):
+    """
+    Report whether this process has finished warming up and is ready to
+    serve launches, for use by load balancer health checks.
+    """
+
+    if not is_ready():
+        return HttpResponse("warming up", status=HTTP_SERVICE_UNAVAILABLE)
+
+    return HttpResponse("ready")
+
+
 def login(request):
     """
     Authenticate user and redirect to requested page on success.
@@ -111,25 +270,12 @@ def view_environments(request, form=ExportEnvironmentForm(), validation_error=Fa
     """
     Retrieve all environments via API. Check if they exist as LTI mapped
     environments.  Then sort according to user and user"s environments.
-    """
 
-    api = APIRequest()
-    environments = api.get("sdis")
-
-    usermap = {}
-
-    for environment in environments:
-        if environment["user"] not in usermap:
-            usermap[environment["user"]] = api.get("accounts/users/{}".format(environment["user"]))
-        environment["user"] = usermap[environment["user"]]
+    Environments are taken from the cached inventory snapshot, which the
+    page then keeps up to date by polling :func:`environment_changes`.
+    """
 
-        try:
-            lti_environment = EnvironmentMap.objects.get(sdios_environment_uuid=environment["sdi_id"])
-            environment["lti_status"] = True
-            environment["lti_name"] = lti_environment.name
-            environment["lti_key"] = lti_environment.lti_environment_key
-        except EnvironmentMap.DoesNotExist:
-            environment["lti_status"] = False
+    snapshot = sdios_lti.inventory.snapshot(APIRequest())
 
     def compare(obj_a, obj_b):
         def cmp_priv(a, b):
@@ -140,21 +286,31 @@ def view_environments(request, form=ExportEnvironmentForm(), validation_error=Fa
 
         return cmp_priv(obj_a["user"]["username"], obj_b["user"]["username"])
 
-    environments = sorted(environments, key=functools.cmp_to_key(compare))
-
-    # Filter out environments belonging to SDI OS LTI users
-    # since it makes no sense to export these.
-    sdios_usernames = [usermap.sdios_username for usermap in UserMap.objects.all()]
-    environments = [environment for environment in environments if environment["user"]["username"] not in sdios_usernames]
+    environments = sorted((row for _, row in snapshot["rows"].values()), key=functools.cmp_to_key(compare))
 
     pkg = {
         "sdis": environments,
         "form": form,
         "error": validation_error,
+        "version": sdios_lti.inventory.token(snapshot),
+        "poll_seconds": settings.LTI_INVENTORY_MAX_AGE,
     }
     return render(request, "environments.html", pkg)
 
 
+@login_required(login_url="/login/")
+def environment_changes(request):
+    """
+    Return, as JSON, the environments which have changed since the
+    version token passed as "since".  See
+    :func:`sdios_lti.inventory.changes`.
+    """
+
+    snapshot = sdios_lti.inventory.snapshot(APIRequest())
+
+    return JsonResponse(sdios_lti.inventory.changes(snapshot, request.GET.get("since")))
+
+
 @login_required(login_url="/login/")
 def export_environment(request):
     """
@@ -166,6 +322,7 @@ def export_environment(request):
 
         if form.is_valid():
             form.save()
+            sdios_lti.inventory.invalidate()
         else:
             # Export environment form with validation errors.
             return view_environments(request, form=form, validation_error=True)
@@ -182,6 +339,7 @@ def remove_lti_access(request, sdi_id):
     try:
         lti_environment = EnvironmentMap.objects.get(sdios_environment_uuid=sdi_id)
         lti_environment.delete()
+        sdios_lti.inventory.invalidate()
     except KeyError:
         return HttpResponseBadRequest("LTI Container does not exist")
     return redirect("sdis")
@@ -213,6 +371,7 @@ def add_consumer(request):
 
         if form.is_valid():
             form.save()
+            sdios_lti.inventory.invalidate()
         else:
             pkg = {
                 "consumers": Consumer.objects.all(),
@@ -250,6 +409,7 @@ def manage_settings(request):
 
         if form.is_valid():
             form.save()
+            sdios_lti.inventory.invalidate()
             # Look the form up again, because ManageSettingsForm might
             # modify the data.
             form = ManageSettingsForm(instance=Setting.get())
@@ -273,3 +433,107 @@ def view_users(request):
         "consumers": consumers,
     }
     return render(request, "users.html", pkg)
+
+
+@login_required(login_url="/login/")
+def view_launches(request):
+    """
+    Report launch volume and latency over a time window, overall and
+    per SDI and consumer.
+    """
+
+    window = request.GET.get("window", "day")
+    if window not in LAUNCH_REPORT_WINDOWS:
+        window = "day"
+    span, trunc = LAUNCH_REPORT_WINDOWS[window]
+
+    launches = LaunchRecord.objects.filter(created__gte=timezone.now() - span)
+    stats = {
+        "launches": Count("pk"),
+        "failures": Count("pk", filter=Q(succeeded=False)),
+        "p50": Percentile("total_ms", 0.5),
+        "p95": Percentile("total_ms", 0.95),
+    }
+
+    pkg = {
+        "window": window,
+        "windows": list(LAUNCH_REPORT_WINDOWS),
+        "totals": launches.aggregate(**stats),
+        "intervals": launches.annotate(interval=trunc("created")).values("interval").annotate(**stats).order_by("interval"),
+        "environments": launches.values("environment__name").annotate(**stats).order_by("-launches"),
+        "consumers": launches.values("consumer__name").annotate(**stats).order_by("-launches"),
+    }
+    return render(request, "launches.html", pkg)
+
+
+@login_required(login_url="/login/")
+def view_api_calls(request):
+    """
+    Show the slowest and failed SDI OS API calls recently made by any
+    worker, and the endpoints they were made to.
+    """
+
+    try:
+        minutes = int(request.GET.get("minutes", 60))
+    except ValueError:
+        minutes = 60
+    if minutes not in API_CALL_WINDOWS:
+        minutes = 60
+
+    calls = recent_calls(minutes)
+    for call in calls:
+        call["time"] = datetime.datetime.fromtimestamp(call["time"], tz=datetime.timezone.utc)
+
+    pkg = {
+        "minutes": minutes,
+        "windows": API_CALL_WINDOWS,
+        "endpoints": summarize(calls),
+        "calls": calls[:100],
+        "slow_ms": settings.LTI_API_SLOW_MS,
+    }
+    return render(request, "api_calls.html", pkg)
+
+
+@login_required(login_url="/login/")
+def view_memory(request):
+    """
+    Show the peak memory of sampled requests to each view, recorded by
+    the memory profiling middleware across all workers.
+    """
+
+    views, over_budget = collect_memory()
+    for request_stats in over_budget:
+        request_stats["time"] = datetime.datetime.fromtimestamp(request_stats["time"], tz=datetime.timezone.utc)
+
+    pkg = {
+        "views": views,
+        "over_budget": over_budget,
+        "enabled": bool(settings.LTI_MEMORY_SAMPLE_RATE),
+    }
+    return render(request, "memory.html", pkg)
+
+
+@login_required(login_url="/login/")
+def view_profiles(request):
+    """
+    List the request profiles written by the profiling middleware.
+    """
+
+    pkg = {
+        "profiles": list_profiles(),
+        "enabled": bool(settings.LTI_PROFILE_SAMPLE_RATE) or settings.LTI_PROFILE_SLOW_MS is not None,
+    }
+    return render(request, "profiles.html", pkg)
+
+
+@login_required(login_url="/login/")
+def download_profile(request, name):
+    """
+    Send a profile in collapsed-stack format, for loading into a flame
+    graph viewer.
+    """
+
+    if name not in [profile["name"] for profile in list_profiles()]:
+        raise Http404("No such profile")
+
+    return FileResponse(open(os.path.join(settings.LTI_PROFILE_DIR, name), "rb"), as_attachment=True, filename=name, content_type="text/plain")
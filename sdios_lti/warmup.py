@@ -0,0 +1,116 @@
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connection, connections
+from django.urls import reverse
+
+from sdios_lti.api import APIRequest
+from sdios_lti.models import Setting
+
+
+_ready = threading.Event()
+
+# The process which has started warming up.  A worker forked from a
+# process which had started must still warm itself up.
+_started = None
+_started_lock = threading.Lock()
+
+
+def is_ready():
+    """
+    Return whether this process has finished warming up, or does not
+    warm up at all.
+
+    :rtype: bool
+    """
+
+    return not settings.LTI_WARMUP or _ready.is_set()
+
+
+def schedule():
+    """
+    Arrange for each worker process to warm up, from `wsgi.py` or
+    `asgi.py`.  These may be loaded in a master process which then forks
+    its workers, so nothing is done here.  Under uWSGI each worker warms
+    up as soon as it is forked; otherwise a worker warms up when its
+    first request, typically a readiness check, arrives.  Does nothing
+    unless `LTI_WARMUP` is set.
+    """
+
+    if not settings.LTI_WARMUP:
+        return
+
+    # Workers must not share the connections of the process they were
+    # forked from.
+    connections.close_all()
+
+    try:
+        from uwsgidecorators import postfork
+    except ImportError:
+        pass
+    else:
+        postfork(start)
+
+    request_started.connect(_start_on_request, dispatch_uid="sdios_lti_warmup")
+
+
+def start():
+    """
+    Warm up this process, unless it has already started to.  The
+    database connection is opened on the calling thread, which will
+    serve requests: the worker's main thread under uWSGI, or the thread
+    serving the first request.  Everything else is done in a background
+    thread.
+    """
+
+    global _started
+
+    with _started_lock:
+        if _started == os.getpid():
+            return
+        _started = os.getpid()
+        _ready.clear()
+
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+    # Connections belong to the thread which opened them, so this one is
+    # kept open (see CONN_MAX_AGE) for the requests this thread serves.
+    try:
+        connection.ensure_connection()
+    except Exception as err:
+        print("Warm-up failed to connect to the database: {}".format(err))
+
+
+def _start_on_request(**kwargs):
+    start()
+
+
+def warm_up():
+    """
+    Pay the costs of the first launch before any launch arrives: load
+    the URLconf, and with it the views and the cryptography used to
+    validate launches; and connect to each SDI OS backend and obtain a
+    token, which is then reused by later API requests.  The database
+    connection is opened by :func:`start`.
+
+    Failures are reported but otherwise ignored, since the first launch
+    will simply pay the remaining costs.  Does nothing unless
+    `LTI_WARMUP` is set.
+    """
+
+    if not settings.LTI_WARMUP:
+        return
+
+    try:
+        reverse("lti")
+        for backend in Setting.objects.all():
+            APIRequest(backend=backend)
+    except Exception as err:
+        print("Warm-up failed: {}".format(err))
+    finally:
+        # This thread's connection, opened to find the backends, is of no
+        # use to requests.
+        connections.close_all()
+        _ready.set()
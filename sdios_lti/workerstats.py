@@ -0,0 +1,117 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+
+class WorkerStats:
+    """
+    Statistics kept in memory by each worker process are periodically
+    written to a file of their own in `LTI_WORKER_STATS_DIR`, so that
+    a page served by any one worker can show them for all workers.  A
+    background thread writes the file every `LTI_WORKER_STATS_INTERVAL`
+    seconds after :meth:`changed` is called, and once more at exit.
+    A worker forked from a process with statistics starts its own
+    thread, and writes its own file.
+
+    :param name: The name of the statistics, used in file names.
+    :type name: string
+    :param snapshot: A function returning the statistics to write, which
+        must be serializable as JSON.
+    :type snapshot: callable
+    """
+
+    def __init__(self, name, snapshot):
+        self.__name = name
+        self.__snapshot = snapshot
+        self.__changed = threading.Event()
+        self.__thread = None
+        self.__lock = threading.Lock()
+        self.__at_exit = False
+        os.register_at_fork(after_in_child=self.__forked)
+
+    def changed(self):
+        """
+        Note that the statistics have changed and should be written out.
+        """
+
+        if self.__thread is None:
+            with self.__lock:
+                if self.__thread is None:
+                    self.__thread = threading.Thread(target=self.__run, name="{}-stats".format(self.__name), daemon=True)
+                    self.__thread.start()
+                    if not self.__at_exit:
+                        atexit.register(self.write)
+                        self.__at_exit = True
+
+        self.__changed.set()
+
+    def write(self):
+        """
+        Write the statistics out now.
+        """
+
+        self.__changed.clear()
+        os.makedirs(settings.LTI_WORKER_STATS_DIR, exist_ok=True)
+        path = os.path.join(settings.LTI_WORKER_STATS_DIR, "{}-{}.json".format(self.__name, os.getpid()))
+
+        # Write to a temporary file and rename it, so that readers never
+        # see a partly written file.
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.__snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def __forked(self):
+        # Only the forking thread survives a fork, so the writer thread,
+        # and any lock it held, must be replaced.
+        self.__changed = threading.Event()
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def __run(self):
+        while True:
+            self.__changed.wait()
+            try:
+                self.write()
+            except Exception as err:
+                print("Unable to write {} statistics: {}".format(self.__name, err))
+            time.sleep(settings.LTI_WORKER_STATS_INTERVAL)
+
+    @staticmethod
+    def collect(name, max_age=None):
+        """
+        Return the statistics written by each worker.  Files which have
+        not been written for `max_age` seconds, such as those left by
+        workers which have exited, are skipped and removed.
+
+        :param name: The name of the statistics.
+        :type name: string
+        :param max_age: Seconds after which a worker's file is considered
+            stale, or `None` to include every file.
+        :type max_age: float or `None`
+        :returns: Pairs of the process ID and its statistics.
+        :rtype: list
+        """
+
+        prefix = "{}-".format(name)
+        try:
+            names = [n for n in os.listdir(settings.LTI_WORKER_STATS_DIR) if n.startswith(prefix) and n.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+        stats = []
+        for file_name in names:
+            path = os.path.join(settings.LTI_WORKER_STATS_DIR, file_name)
+            try:
+                if max_age is not None and os.path.getmtime(path) < time.time() - max_age:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    stats.append((int(file_name[len(prefix):-len(".json")]), json.load(f)))
+            except (OSError, ValueError):
+                continue
+
+        return stats
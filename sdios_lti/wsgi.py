@@ -12,3 +12,6 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sdios_lti.settings")
 
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
+
+from sdios_lti.warmup import schedule
+schedule()